@@ -1,6 +1,37 @@
-from typing import List, Dict
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+import asyncio
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse, urlsplit
+from extractor import GoogleResultExtractor, SearchResult
+from metrics import metrics
+from resilience import FetchError, detect_captcha
+from utils import (
+    GOOGLE_RESULT_MARKER,
+    HTTP_HEADERS,
+    create_http_session,
+    scroll_items,
+    wait_until_ready,
+)
+
+
+def _import_aiohttp():
+    # Listed in requirements.txt; without it the async engine falls back to
+    # pooled requests in worker threads. Imported lazily as it is slow to load.
+    try:
+        import aiohttp
+
+        return aiohttp
+    except ImportError:
+        return None
+
+
+def start_offset(link):
+    """The `start` parameter of a result page URL, see construct_search_urls."""
+    return int(parse_qs(urlsplit(link).query).get("start", ["0"])[0])
+
 
 # from l_scappy.internal_logger import get_logger
 # from fake_useragent import UserAgent
@@ -9,19 +40,32 @@ from selenium.webdriver.chrome.options import Options
 
 class GScapper:
     def __init__(
-        self, search_query: str, max_number: int, headless: bool = True
+        self,
+        search_query: str,
+        max_number: int,
+        headless: bool = True,
+        max_scrolls: int = 20,
+        scroll_budget: float = 30,
+        page_size: int = 10,
     ) -> None:
         self.search_query = search_query
         self.max_number = max_number
+        self.page_size = page_size
         self.headless = headless
+        self.max_scrolls = max_scrolls
+        self.scroll_budget = scroll_budget
         self.platforms = "pc"
         self.oss = ["macos", "windows", "linux"]
         self.browsers = ["chrome", "edge"]
 
     def construct_search_urls(self, range_start: int) -> List[str]:
         url_list = []
-        for start in range(range_start, self.max_number, 10):
-            url = f"{self.search_query}&start={start}"
+        for start in range(range_start, self.max_number, self.page_size):
+            # Google serves 10 results a page unless told otherwise with
+            # `num`; the last page only asks for the results still missing.
+            size = min(self.page_size, self.max_number - start)
+            num = f"&num={size}" if size != 10 else ""
+            url = f"{self.search_query}&start={start}{num}"
             url_list.append(url)
         print(
             f"Done with constructing search urls, 'length of url_list': {len(url_list)}"
@@ -29,7 +73,24 @@ class GScapper:
         return url_list
 
     async def scrape_content(self, url: str) -> str:
-        print("Attempting to scrape content on google", extra={"url": url})
+        # Selenium is blocking, so the browser session runs in a worker thread.
+        return await asyncio.to_thread(self._scrape_content, url)
+
+    async def scrape_all(
+        self, range_start: int = 0, **kwargs
+    ) -> List[Union[str, BaseException]]:
+        """
+        Fetches every search URL concurrently with `fetch_all`. Pass
+        `fetch=None` for plain async HTTP; by default each URL is scraped in a
+        headless browser with `scrape_content`.
+        """
+        kwargs.setdefault("fetch", self._scrape_content)
+        return await fetch_all(self.construct_search_urls(range_start), **kwargs)
+
+    def _create_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
         chrome_options = Options()
         if self.headless:
             chrome_options.add_argument("--headless")
@@ -46,27 +107,334 @@ class GScapper:
         driver.execute_script(
             "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
         )
+        return driver
+
+    def iter_results(self, url: str) -> Iterator[SearchResult]:
+        """
+        Loads `url` in a browser and yields its search results while the page
+        is still being scrolled, so extraction overlaps with loading.
+        """
+        print(f"Attempting to scrape content on google, 'url': {url}")
+        extractor = GoogleResultExtractor()
+        driver = self._create_driver()
+        try:
+            driver.get(url)
+            wait_until_ready(driver, url)
+            for found in scroll_items(
+                driver,
+                f"div.{GOOGLE_RESULT_MARKER}",
+                fields=extractor.field_specs(),
+                max_scrolls=self.max_scrolls,
+                time_budget=self.scroll_budget,
+            ):
+                yield from extractor.extract_fields([found])
+        finally:
+            driver.quit()
+        print(f"Done scrapping content on google, 'url': {url}")
 
-        driver.get(url)
+    def _scrape_content(self, url: str) -> str:
+        print(f"Attempting to scrape content on google, 'url': {url}")
+        driver = self._create_driver()
+        try:
+            driver.get(url)
+            wait_until_ready(driver, url)
+            for _ in scroll_items(
+                driver,
+                f"div.{GOOGLE_RESULT_MARKER}",
+                max_scrolls=self.max_scrolls,
+                time_budget=self.scroll_budget,
+            ):
+                pass
+            html_content = driver.page_source
+            # await display_html_content(html_content)
+        finally:
+            driver.quit()
+        print(f"Done scrapping content on google, 'url': {url}")
+        return html_content
+
+
+class PaginationTracker:
+    """
+    Decides per keyword when a search has run out of results, so the pages
+    after it are never fetched.
+
+    A keyword ends at the first page that has no results, whose results were
+    mostly (`max_duplicate_ratio`) seen on an earlier page of the same keyword,
+    or that has no next-page link. The last check is only trusted once a
+    next-page link has been seen in the run, so a changed selector can't end
+    every search after its first page.
+
+    A page is settled once it was recorded, or given up on with `settle`;
+    `walk_pages` waits for that before deciding on the pages after it.
+    """
 
-        last_height = driver.execute_script("return document.body.scrollHeight")
-        while True:
-            driver.execute_script(
-                "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+    def __init__(self, max_duplicate_ratio: float = 0.8) -> None:
+        self.max_duplicate_ratio = max_duplicate_ratio
+        self._lock = threading.Lock()
+        self._last_page: Dict[str, int] = {}
+        self._links: Dict[str, set] = defaultdict(set)
+        self._settled: Dict[str, set] = defaultdict(set)
+        self._next_page_seen = False
+
+    def wanted(self, keyword: str, start: int) -> bool:
+        with self._lock:
+            return start <= self._last_page.get(keyword, start)
+
+    def settle(self, keyword: str, start: int) -> None:
+        """Marks a page that won't be recorded, e.g. one that failed to parse."""
+        with self._lock:
+            self._settled[keyword].add(start)
+
+    def settled(self, keyword: str, start: int) -> bool:
+        with self._lock:
+            return start in self._settled[keyword] or start > self._last_page.get(
+                keyword, start
             )
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            driver.execute_script("return navigator.userAgent;")
 
-            driver.implicitly_wait(5)
+    def record(
+        self,
+        keyword: str,
+        start: int,
+        links: List[str],
+        has_next: Optional[bool],
+    ) -> Optional[str]:
+        """
+        Records the links found on a result page. Returns why the keyword's
+        results ended on this page, or None if there may be more.
+        """
+        with self._lock:
+            self._settled[keyword].add(start)
+            seen = self._links[keyword]
+            new_links = set(links) - seen
+            seen.update(new_links)
+            if has_next:
+                self._next_page_seen = True
 
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                break
-            last_height = new_height
+            reason = None
+            if not links:
+                reason = "no results"
+            elif 1 - len(new_links) / len(links) >= self.max_duplicate_ratio:
+                reason = f"{1 - len(new_links) / len(links):.0%} duplicate results"
+            elif has_next is False and self._next_page_seen:
+                reason = "no next page"
+            if reason is not None and start < self._last_page.get(keyword, start + 1):
+                self._last_page[keyword] = start
+                print(f"Results for '{keyword}' end at start={start}: {reason}")
+            return reason
 
-        html_content = driver.page_source
-        # await display_html_content(html_content)
 
-        driver.quit()
-        print("Done scrapping content on google", extra={"url": url})
-        return html_content
+async def _fetch_http(
+    session, url: str, timeout: float, aiohttp=None, executor=None
+) -> str:
+    if aiohttp is not None:
+        async with session.get(
+            url, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as resp:
+            resp.raise_for_status()
+            return await resp.text()
+
+    def get():
+        resp = session.get(url, timeout=timeout)
+        resp.raise_for_status()
+        return resp.text
+
+    return await asyncio.get_running_loop().run_in_executor(executor, get)
+
+
+@asynccontextmanager
+async def open_fetcher(
+    concurrency: int = 10,
+    per_host: int = 4,
+    timeout: float = 30,
+    rate_limiter=None,
+    cache=None,
+    fetch: Optional[Callable[[str], str]] = None,
+    resilience=None,
+):
+    """
+    Yields an async `fetch_one(url)` that returns a page's HTML, shared by
+    `fetch_all` and `walk_pages`.
+
+    At most `concurrency` requests are in flight overall and `per_host` per
+    host; `rate_limiter` (a utils.RateLimiter) spaces out request starts.
+    Without `fetch`, pages are requested over aiohttp, or pooled requests in
+    worker threads when aiohttp is not installed; otherwise the blocking
+    `fetch` callable is run in a worker thread. Worker threads come from a
+    pool of `concurrency` threads. aiohttp requests are cancelled after
+    `timeout` seconds; a thread can't be, so threaded fetches rely on their
+    own timeouts (the requests timeout, a driver's page load timeout) instead
+    of being abandoned while they keep running. Pages in `cache` (a
+    cache.PageCache) are served without a request. With `resilience` (a
+    resilience.Resilience) HTTP requests are retried and circuit-broken per
+    host; a `fetch` callable is expected to do its own.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    aiohttp = _import_aiohttp()
+    session = None
+    if fetch is None:
+        if aiohttp is not None:
+            session = aiohttp.ClientSession(
+                headers=HTTP_HEADERS,
+                connector=aiohttp.TCPConnector(
+                    limit=concurrency, limit_per_host=per_host
+                ),
+            )
+        else:
+            session = create_http_session(concurrency)
+    executor = None
+    if fetch is not None or aiohttp is None:
+        # The default executor has at most 32 threads, whatever `concurrency`.
+        executor = ThreadPoolExecutor(concurrency, thread_name_prefix="fetch")
+
+    async def attempt(url: str) -> str:
+        # Backoff happens outside the semaphores, so waiting URLs don't hold
+        # a request slot.
+        async with semaphore, host_semaphores[urlparse(url).netloc]:
+            if rate_limiter is not None:
+                delay = rate_limiter.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            loop = asyncio.get_running_loop()
+            if fetch is not None:
+                return await loop.run_in_executor(executor, fetch, url)
+            with metrics.time("page_load"):
+                html = _fetch_http(session, url, timeout, aiohttp, executor)
+                if aiohttp is not None:
+                    html = asyncio.wait_for(html, timeout)
+                html = await html
+        if detect_captcha(html):
+            raise FetchError("captcha", url, f"CAPTCHA served for {url}")
+        return html
+
+    async def fetch_one(url: str) -> str:
+        if cache is not None:
+            html = cache.get(url)
+            if html is not None:
+                metrics.incr("cache_hits")
+                return html
+        if resilience is not None and fetch is None:
+            html = await resilience.call_async(url, lambda: attempt(url))
+        else:
+            html = await attempt(url)
+        if cache is not None and fetch is None:
+            cache.put(url, html)
+        return html
+
+    try:
+        yield fetch_one
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if session is not None:
+            if aiohttp is not None:
+                await session.close()
+            else:
+                session.close()
+
+
+async def _cancel(tasks) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def fetch_all(urls: List[str], **kwargs) -> List[Union[str, BaseException]]:
+    """
+    Fetches `urls` concurrently and returns their HTML in the same order; see
+    `open_fetcher` for the options. A failed URL yields its exception instead
+    of HTML; cancelling the caller cancels every pending request.
+    """
+    async with open_fetcher(**kwargs) as fetch_one:
+        tasks = [asyncio.create_task(fetch_one(url)) for url in urls]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            await _cancel(tasks)
+            raise
+
+
+async def walk_pages(
+    jobs: List[Tuple[str, str]],
+    on_page: Callable[[str, str, Union[str, BaseException]], None],
+    tracker: Optional[PaginationTracker] = None,
+    ahead: int = 1,
+    **kwargs,
+) -> int:
+    """
+    Fetches the `(keyword, url)` result pages in `jobs` and hands each to
+    `on_page(keyword, url, html)`, with the exception instead of HTML for a
+    failed page. Returns the number of pages that were not handed on because
+    their keyword's results had ended.
+
+    Every keyword walks its own pages concurrently with the other keywords,
+    with at most `ahead` of its pages fetched or waiting to be handed on at a
+    time. Pages are handed on in job order: a keyword's pages in page order,
+    after those of the keywords before it, so which keyword a result shared
+    by several is credited to doesn't depend on timing. With a `tracker` a
+    keyword's next page is only requested once the page `ahead` before it
+    has been settled, and only if its results haven't ended, so no more than
+    `ahead - 1` pages per keyword are fetched past the end. `on_page` runs in
+    a worker thread and may block for backpressure; the walk stops if it
+    raises. See `open_fetcher` for the other options.
+    """
+    urls_by_keyword = defaultdict(list)
+    for keyword, url in jobs:
+        urls_by_keyword[keyword].append(url)
+    loop = asyncio.get_running_loop()
+    # Set once a keyword and every keyword before it are handed on.
+    finished = [asyncio.Event() for _ in urls_by_keyword]
+
+    async def hand_on(index, keyword, url, task):
+        try:
+            html = await task
+        except Exception as err:
+            html = err
+        if index:
+            await finished[index - 1].wait()
+        await loop.run_in_executor(None, on_page, keyword, url, html)
+        if tracker is None:
+            return
+        start = start_offset(url)
+        if isinstance(html, BaseException):
+            tracker.settle(keyword, start)
+        # The page is recorded once it has been through extraction.
+        while not tracker.settled(keyword, start):
+            await asyncio.sleep(0.01)
+
+    async def walk(fetch_one, index, keyword, urls):
+        in_flight = deque()
+        handed_on = 0
+        try:
+            for url in urls:
+                if len(in_flight) >= max(1, ahead):
+                    await hand_on(index, keyword, *in_flight.popleft())
+                    handed_on += 1
+                if tracker is not None and not tracker.wanted(
+                    keyword, start_offset(url)
+                ):
+                    # The pages still in flight are past the end as well.
+                    break
+                in_flight.append((url, asyncio.create_task(fetch_one(url))))
+            else:
+                while in_flight:
+                    await hand_on(index, keyword, *in_flight.popleft())
+                    handed_on += 1
+        finally:
+            await _cancel([task for _, task in in_flight])
+        if index:
+            await finished[index - 1].wait()
+        finished[index].set()
+        return len(urls) - handed_on
+
+    async with open_fetcher(**kwargs) as fetch_one:
+        walkers = [
+            asyncio.create_task(walk(fetch_one, index, keyword, urls))
+            for index, (keyword, urls) in enumerate(urls_by_keyword.items())
+        ]
+        try:
+            return sum(await asyncio.gather(*walkers))
+        except BaseException:
+            await _cancel(walkers)
+            raise
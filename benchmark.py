@@ -0,0 +1,736 @@
+"""
+Benchmarks for the scraper's hot paths, run against saved or synthetic pages.
+
+    python benchmark.py extract --fixture saved-serp.html --repeat 50
+    python benchmark.py classify --rows 1000000
+    python benchmark.py startup
+    python benchmark.py record "https://www.google.com/search?q=jobs" --out fixtures
+    python benchmark.py scrape --fixture fixtures/*.html
+    python benchmark.py filter --rows 10000 1000000 10000000
+    python benchmark.py micro
+    python benchmark.py compare
+
+Every run appends its numbers, tagged with the current commit, to
+benchmark-results.jsonl (see --results_file); `compare` shows the change of each
+benchmark between the two most recent commits it was run on.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import Namespace
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from classifier import RuleClassifier
+from extractor import GoogleResultExtractor
+
+WORDS = (
+    "senior remote software engineer developer cloud data scientist junior staff "
+    "property sellers verified jiji trading competition event ai platform python "
+    "backend frontend lagos accra nairobi apply now salary full time contract"
+).split()
+
+
+def build_serp_fixture(results=10, seed=0):
+    """
+    Builds a page shaped like a Google results page: a heavy head, nested
+    wrapper divs around every result block and a few blocks without a title
+    ("People also ask" and similar).
+    """
+    rng = random.Random(seed)
+
+    def sentence(length):
+        return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+    blocks = []
+    for i in range(results):
+        date = (
+            f"{rng.randint(1, 28)} {rng.choice(['Jan', 'Mar', 'Oct', 'Dec'])} 2024"
+            if i % 2
+            else f"{rng.randint(1, 20)} days ago"
+        )
+        blocks.append(
+            f"""<div class="MjjYud"><div class="g Ww4FFb vt6azd tF2Cxc asEBEc" lang="en" data-hveid="CA{i}QAA" data-ved="2ahUKE{i}">
+<div class="N54PNb BToiNc cvP2Ce" data-snc="ih6Jnb_{i}"><div class="kb0PBd cvP2Ce jGGQ5e" data-snf="x5WNvb" data-snhf="0">
+<div class="yuRUbf"><div><span jscontroller="msmzHf" jsaction="rcuQ6b:npT2md;PYDNKe:bLV6Bd"><a jsname="UWckNb" href="https://example{i}.com/jobs/{i}?utm_source=google" data-ved="2ahUK{i}" ping="/url?sa=t">
+<br><h3 class="LC20lb MBeuO DKV0Md">{sentence(6)}</h3><div class="notranslate TbwUpd NJjxre iUh30 ojE3Fb"><span class="H9lube"><div class="eqA2re NjwKYd Vwoesf" aria-hidden="true"><img class="XNo5Ab" src="data:image/png;base64,iVBORw0KGgo=" alt=""></div></span>
+<div><span class="VuuXrf">example{i}.com</span><div class="byrV5b"><cite class="tjvcx GvPZzd cHaqb" role="text">https://example{i}.com<span class="ylgVCe ob9lvb" role="text"> › jobs</span></cite></div></div></div></a></span></div></div></div>
+<div class="kb0PBd cvP2Ce A9Y9g" data-sncf="1" data-snf="nke7rc"><div class="VwiC3b yXK7lf lVm3ye r025kc hJNv6b Hdw6tb" style="-webkit-line-clamp:2"><span class="LEwnzc Sqrs4e"><span>{date}</span> — </span><span>{sentence(25)}</span></div></div>
+</div></div></div>"""
+        )
+        if i % 4 == 3:
+            blocks.append(
+                f"""<div class="MjjYud"><div class="cUnQKe"><div class="related-question-pair">
+<span>{sentence(8)}?</span></div></div></div>"""
+            )
+
+    head = "".join(
+        f"<style>.c{i}{{display:block;margin:{i}px}}</style>" for i in range(200)
+    ) + "".join(
+        f"<script nonce='n{i}'>(function(){{var a={i};window.g=a}})();</script>"
+        for i in range(50)
+    )
+    return (
+        f"<!doctype html><html itemscope lang='en'><head><title>results</title>{head}</head>"
+        f"<body><div id='main'><div id='rcnt'><div id='search'><div id='rso'>"
+        f"{''.join(blocks)}</div></div></div></div></body></html>"
+    )
+
+
+def legacy_extract(html):
+    """
+    The original extraction path: a full html.parser tree, `find_all` over the
+    document and four `find()` walks plus uncompiled regexes per result.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for result_div in soup.find_all("div", class_="MjjYud"):
+        title_element = result_div.find("h3", class_="LC20lb")
+        title = title_element.text if title_element else "No title found"
+        date_span = result_div.find("span", class_="LEwnzc")
+        date_str = date_span.text if date_span else None
+        date = None
+        if date_str:
+            date_match = re.search(r"\d{1,2}\s\w{3}\s\d{4}", date_str)
+            if date_match:
+                date = datetime.strptime(date_match.group(), "%d %b %Y").date()
+            else:
+                relative_date_match = re.search(
+                    r"(\d+)\s*(day|hour|minute)s?\s*ago", date_str, re.IGNORECASE
+                )
+                if relative_date_match:
+                    number, unit = relative_date_match.groups()
+                    if "day" in unit.lower():
+                        date = datetime.now().date() - timedelta(days=int(number))
+        desc_div = result_div.find("div", class_="VwiC3b")
+        description = desc_div.text if desc_div else "No description found"
+        link_element = result_div.find("a", attrs={"jsname": "UWckNb"})
+        link = link_element["href"] if link_element else "No link found"
+        results.append(
+            {"title": title, "date": date, "description": description, "link": link}
+        )
+    return results
+
+
+def build_history(rows=1_000_000, seed=0):
+    """
+    Builds a synthetic result history with the columns main.py writes.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(
+        [word.capitalize() for word in WORDS] + WORDS + ["AI", "Data Scientist"]
+    )
+    titles = [
+        " ".join(words) for words in rng.choice(vocabulary, size=(rows, 6)).tolist()
+    ]
+    descriptions = [
+        " ".join(words) for words in rng.choice(vocabulary, size=(rows, 20)).tolist()
+    ]
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(
+        rng.integers(0, 365, size=rows), unit="D"
+    )
+    return pd.DataFrame(
+        {
+            "title": titles,
+            "date": dates,
+            "description": descriptions,
+            "keyword": rng.choice(["jobs", "property", "trading"], size=rows),
+            "link": [f"https://example.com/{i}" for i in range(rows)],
+        }
+    )
+
+
+def legacy_classify(data):
+    """
+    The original derived columns: three `str.contains` passes and two
+    per-row Python lambdas.
+    """
+    data["Remote"] = data["title"].str.contains("Remote", case=False)
+    data["Software Engineer"] = data["title"].str.contains("Engineer", case=False)
+    data["Developer"] = data["title"].str.contains("Developer", case=False)
+    data["Experience Level"] = data["title"].apply(
+        lambda x: (
+            "Junior"
+            if "Junior" in x
+            else ("Senior" if "Senior" in x else ("Staff" if "Staff" in x else "All"))
+        )
+    )
+    data["Job Type"] = data["title"].apply(
+        lambda x: (
+            "Cloud"
+            if "Cloud" in x
+            else (
+                "AI"
+                if "AI" in x
+                else ("Data Scientist" if "Data Scientist" in x else "All")
+            )
+        )
+    )
+    return data
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(ROOT, "benchmark-results.jsonl")
+
+
+def current_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}+dirty" if dirty else commit
+
+
+def save_result(args, bench, name, **values):
+    """
+    Appends one measurement to the results file so runs on different commits
+    can be compared with `benchmark.py compare`.
+    """
+    if not args.results_file:
+        return
+    record = {
+        "commit": current_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "bench": bench,
+        "name": name,
+        **values,
+    }
+    with open(args.results_file, "a", encoding="utf-8") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+def time_it(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def load_pages(args):
+    if args.fixture:
+        pages = []
+        for path in args.fixture:
+            with open(path, encoding="utf-8") as file:
+                pages.append(file.read())
+        return pages
+    return [build_serp_fixture(args.results, seed) for seed in range(5)]
+
+
+def bench_extract(args):
+    pages = load_pages(args)
+    extractor = GoogleResultExtractor()
+    candidates = {
+        "legacy (html.parser, 4x find)": legacy_extract,
+        "single pass (html.parser)": lambda html: extractor.extract_html(
+            html, "html.parser"
+        ),
+        "single pass (bs4 + lxml)": lambda html: extractor.extract_soup(
+            BeautifulSoup(html, "lxml")
+        ),
+        "xpath batch (lxml)": lambda html: extractor.extract_html(html, "lxml"),
+    }
+
+    result_count = sum(len(legacy_extract(html)) for html in pages)
+    print(f"{len(pages)} pages, {result_count} result blocks, {args.repeat} rounds")
+    baseline = None
+    for name, extract in candidates.items():
+        seconds = time_it(lambda: [extract(html) for html in pages], args.repeat)
+        baseline = baseline or seconds
+        print(
+            f"{name:<32} {seconds / len(pages) * 1000:8.2f} ms/page "
+            f"{result_count / seconds:10.0f} results/s {baseline / seconds:6.1f}x"
+        )
+        save_result(
+            args,
+            "extract",
+            name,
+            pages_per_second=len(pages) / seconds,
+            results_per_second=result_count / seconds,
+        )
+
+
+def bench_classify(args):
+    history = build_history(args.rows)
+    classifier = RuleClassifier()
+    print(f"{len(history)} rows, {args.repeat} rounds")
+    legacy = time_it(lambda: legacy_classify(history.copy()), args.repeat)
+    rules = time_it(lambda: classifier.classify(history.copy()), args.repeat)
+    for name, seconds in (("legacy (apply)", legacy), ("rule classifier", rules)):
+        print(
+            f"{name:<32} {seconds:8.2f} s {len(history) / seconds:12.0f} rows/s "
+            f"{legacy / seconds:6.1f}x"
+        )
+        save_result(
+            args,
+            "classify",
+            f"{name} ({len(history)} rows)",
+            rows_per_second=len(history) / seconds,
+        )
+
+
+STARTUP_COMMANDS = {
+    "main.py --help": ["main.py", "--help"],
+    "filter.py --help": ["filter.py", "--help"],
+    "import main": ["-c", "import main"],
+    "from filter import filter_asc": ["-c", "from filter import filter_asc"],
+}
+
+
+def bench_startup(args):
+    root = ROOT
+    print(f"{args.repeat} runs per command, python: {sys.executable}")
+    for name, command in STARTUP_COMMANDS.items():
+        seconds = time_it(
+            lambda: subprocess.run(
+                [sys.executable, *command],
+                cwd=root,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            ),
+            args.repeat,
+        )
+        print(f"{name:<32} {seconds * 1000:8.1f} ms")
+        save_result(args, "startup", name, seconds=seconds)
+
+
+def record_pages(args):
+    """
+    Saves result pages as fixtures for `extract` and `scrape`, fetched over
+    plain HTTP like `main.py --fetch-mode http`.
+    """
+    from utils import ScraperUtils
+
+    scraper = ScraperUtils()
+    os.makedirs(args.out, exist_ok=True)
+    for i, url in enumerate(args.urls):
+        html = scraper.request_html(url)
+        path = os.path.join(args.out, f"serp-{i:03d}.html")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(html)
+        print(f"Recorded {url} -> {path} ({len(html)} bytes)")
+
+
+class ReplayServer:
+    """
+    Local stand-in for the search engine: serves the recorded pages in turn,
+    picking one by the `start` parameter of the request.
+    """
+
+    def __init__(self, pages):
+        pages = [page.encode("utf-8") for page in pages]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                start = int(query.get("start", ["0"])[0])
+                body = pages[start // 10 % len(pages)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/search?"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+SCRAPE_MODES = {
+    "http, threads, lxml": ["--engine", "threads", "--parser", "lxml"],
+    "http, threads, html.parser": ["--engine", "threads", "--parser", "html.parser"],
+    "http, async, lxml": ["--engine", "async", "--parser", "lxml"],
+    "http, async, html.parser": ["--engine", "async", "--parser", "html.parser"],
+}
+
+
+def bench_scrape(args):
+    """
+    Runs main.py end to end against the replay server and reads pages/s and
+    results/s from the run metrics. Browser modes need a real browser and
+    are not part of this benchmark.
+    """
+    pages = load_pages(args)
+    print(
+        f"{len(pages)} recorded pages, {args.pages} pages per run, "
+        f"{args.workers} workers, {args.repeat} rounds"
+    )
+    with ReplayServer(pages) as server:
+        for name, options in SCRAPE_MODES.items():
+            runs = []
+            for _ in range(args.repeat):
+                workdir = tempfile.mkdtemp(prefix="scrape-bench-")
+                try:
+                    metrics_file = os.path.join(workdir, "metrics.json")
+                    subprocess.run(
+                        [
+                            sys.executable,
+                            os.path.join(ROOT, "main.py"),
+                            "--search_url",
+                            server.url,
+                            "--fetch_mode",
+                            "http",
+                            "--max_results",
+                            str(args.pages * 10),
+                            "--workers",
+                            str(args.workers),
+                            "--request_interval",
+                            "0",
+                            "--dedup_index",
+                            "",
+                            "--progress_interval",
+                            "0",
+                            "--metrics_json",
+                            metrics_file,
+                            *options,
+                        ],
+                        cwd=workdir,
+                        stdout=subprocess.DEVNULL,
+                        check=True,
+                    )
+                    with open(metrics_file, encoding="utf-8") as file:
+                        runs.append(json.load(file))
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+            seconds = statistics.median(run["elapsed_seconds"] for run in runs)
+            counters = runs[0]["counters"]
+            # The replayed pages repeat, so most results are dedup hits; they
+            # were fetched and extracted all the same.
+            extracted = counters["results"] + counters["dedup_hits"]
+            pages_per_second = counters["pages"] / seconds
+            results_per_second = extracted / seconds
+            print(
+                f"{name:<32} {pages_per_second:8.1f} pages/s "
+                f"{results_per_second:10.0f} results/s"
+            )
+            save_result(
+                args,
+                "scrape",
+                name,
+                pages_per_second=pages_per_second,
+                results_per_second=results_per_second,
+            )
+
+
+FILTER_MODES = {
+    "in memory": [],
+    "stream": ["--stream"],
+}
+
+FILTER_QUERY = ["--remote", "yes", "--experience", "Senior", "--sort", "date"]
+
+
+def bench_filter(args):
+    """
+    Times filter.py end to end on synthetic histories of each size. Larger
+    histories are generated and written in pieces to keep memory in check.
+    Exits with an error if the modes don't write identical output.
+    """
+    differ = False
+    for rows in args.rows:
+        workdir = tempfile.mkdtemp(prefix="filter-bench-")
+        try:
+            os.makedirs(os.path.join(workdir, "data"))
+            path = os.path.join(workdir, "data", "search_results.csv")
+            for offset in range(0, rows, 1_000_000):
+                piece = build_history(min(1_000_000, rows - offset), seed=offset)
+                piece.to_csv(path, mode="a", header=offset == 0, index=False)
+            modes = dict(FILTER_MODES)
+            if rows > args.max_in_memory:
+                modes.pop("in memory")
+            outputs = {}
+            for name, options in modes.items():
+                seconds = time_it(
+                    lambda: subprocess.run(
+                        [
+                            sys.executable,
+                            os.path.join(ROOT, "filter.py"),
+                            "--input",
+                            path,
+                            "--limit",
+                            "100",
+                            *FILTER_QUERY,
+                            *options,
+                        ],
+                        cwd=workdir,
+                        stdout=subprocess.DEVNULL,
+                        check=True,
+                    ),
+                    args.repeat,
+                )
+                print(
+                    f"{rows:>10} rows {name:<20} {seconds:8.2f} s {rows / seconds:12.0f} rows/s"
+                )
+                save_result(
+                    args,
+                    "filter",
+                    f"{name} ({rows} rows)",
+                    seconds=seconds,
+                    rows_per_second=rows / seconds,
+                )
+                with open(
+                    os.path.join(workdir, "data", "filtered_results.csv"), "rb"
+                ) as file:
+                    outputs[name] = hashlib.sha256(file.read()).hexdigest()
+            # Every mode has to write the same rows, ties on the sort key included.
+            if len(set(outputs.values())) > 1:
+                print(f"{rows:>10} rows OUTPUTS DIFFER between {', '.join(outputs)}")
+                differ = True
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if differ:
+        sys.exit("filter.py modes wrote different results")
+
+
+def bench_micro(args):
+    """
+    Per-call costs of small helpers on the hot path: search URL building,
+    per-result extraction and the CSV writers.
+    """
+    import main
+    from utils import CSVSink, ScraperUtils
+
+    scraper = ScraperUtils(parser="lxml")
+    options = Namespace(
+        search_url="https://www.google.com/search?",
+        all_these_words="python",
+        exact_phrase=None,
+        any_of_these_words=None,
+        none_of_these_words=None,
+        number_range_low=None,
+        number_range_high=None,
+        language="lang_en",
+        region=None,
+        last_update="m",
+        site_search=None,
+        terms_appearing=None,
+        file_type=None,
+        usage_rights=None,
+    )
+    soup = BeautifulSoup(build_serp_fixture(args.results), "html.parser")
+    blocks = soup.find_all("div", class_="MjjYud")
+    rows = [result.to_dict() for result in build_results(args.results)]
+    workdir = tempfile.mkdtemp(prefix="micro-bench-")
+
+    def write_csv():
+        scraper.write_data_to_csv(rows, os.path.join(workdir, "legacy.csv"))
+
+    sink = CSVSink()
+
+    def write_sink():
+        sink.write(os.path.join(workdir, "sink.csv"), rows)
+
+    candidates = {
+        "create_search_string": (
+            lambda: main.create_search_string(options, "remote jobs"),
+            1,
+        ),
+        "extract_google_search_result": (
+            lambda: [scraper.extract_google_search_result(block) for block in blocks],
+            len(blocks),
+        ),
+        "write_data_to_csv": (write_csv, len(rows)),
+        "CSVSink.write": (write_sink, len(rows)),
+    }
+    try:
+        for name, (func, items) in candidates.items():
+            calls = max(1, args.calls // items)
+            seconds = time_it(lambda: [func() for _ in range(calls)], args.repeat)
+            per_item = seconds / (calls * items)
+            print(f"{name:<32} {per_item * 1e6:10.2f} us/item")
+            save_result(args, "micro", name, seconds_per_item=per_item)
+    finally:
+        sink.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def build_results(count):
+    from extractor import GoogleResultExtractor
+
+    return GoogleResultExtractor().extract_html(build_serp_fixture(count), "lxml")
+
+
+def compare_results(args):
+    """
+    Compares every benchmark between the last two commits it was run on.
+    Higher is better for rates, lower is better for times.
+    """
+    if not os.path.isfile(args.results_file):
+        print(f"No results in '{args.results_file}' yet")
+        return
+    latest = {}
+    with open(args.results_file, encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            runs = latest.setdefault((record["bench"], record["name"]), {})
+            # Later runs on the same commit replace earlier ones.
+            runs.pop(record["commit"], None)
+            runs[record["commit"]] = record
+
+    for (bench, name), runs in latest.items():
+        commits = list(runs)
+        if args.baseline:
+            if args.baseline not in runs:
+                continue
+            old, new = runs[args.baseline], runs[commits[-1]]
+        elif len(commits) >= 2:
+            old, new = runs[commits[-2]], runs[commits[-1]]
+        else:
+            continue
+        for key, value in new.items():
+            if not isinstance(value, float) or key not in old:
+                continue
+            change = (value - old[key]) / old[key] * 100 if old[key] else 0.0
+            better = change >= 0 if "per_second" in key else change <= 0
+            flag = "" if better or abs(change) < args.threshold else "  REGRESSION"
+            print(
+                f"{bench:<9} {name:<40} {key:<20} {old['commit']:>14} -> "
+                f"{new['commit']:<14} {change:+7.1f}%{flag}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scraper hot paths.")
+    parser.add_argument(
+        "--results_file",
+        default=RESULTS_FILE,
+        help="JSON lines file the results are appended to (empty to not save)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = subparsers.add_parser(
+        "extract", help="Google result extraction per page"
+    )
+    extract_parser.add_argument(
+        "--fixture", nargs="+", help="Saved Google result pages (HTML)"
+    )
+    extract_parser.add_argument(
+        "--results",
+        type=int,
+        default=10,
+        help="Results per synthetic page when no fixture is given",
+    )
+    extract_parser.add_argument("--repeat", type=int, default=20)
+    extract_parser.set_defaults(func=bench_extract)
+
+    classify_parser = subparsers.add_parser(
+        "classify", help="filter.py derived columns over a synthetic history"
+    )
+    classify_parser.add_argument("--rows", type=int, default=1_000_000)
+    classify_parser.add_argument("--repeat", type=int, default=3)
+    classify_parser.set_defaults(func=bench_classify)
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Process start-up time of the command line entry points"
+    )
+    startup_parser.add_argument("--repeat", type=int, default=10)
+    startup_parser.set_defaults(func=bench_startup)
+
+    record_parser = subparsers.add_parser(
+        "record", help="Save result pages as fixtures for extract and scrape"
+    )
+    record_parser.add_argument("urls", nargs="+")
+    record_parser.add_argument("--out", default="fixtures")
+    record_parser.set_defaults(func=record_pages)
+
+    scrape_parser = subparsers.add_parser(
+        "scrape", help="main.py end to end against a local replay of result pages"
+    )
+    scrape_parser.add_argument(
+        "--fixture", nargs="+", help="Recorded Google result pages (HTML)"
+    )
+    scrape_parser.add_argument(
+        "--results",
+        type=int,
+        default=10,
+        help="Results per synthetic page when no fixture is given",
+    )
+    scrape_parser.add_argument("--pages", type=int, default=50)
+    scrape_parser.add_argument("--workers", type=int, default=4)
+    scrape_parser.add_argument("--repeat", type=int, default=3)
+    scrape_parser.set_defaults(func=bench_scrape)
+
+    filter_parser = subparsers.add_parser(
+        "filter", help="filter.py throughput on synthetic histories"
+    )
+    filter_parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 1_000_000]
+    )
+    filter_parser.add_argument(
+        "--max_in_memory",
+        type=int,
+        default=2_000_000,
+        help="Larger histories are only run with --stream",
+    )
+    filter_parser.add_argument("--repeat", type=int, default=3)
+    filter_parser.set_defaults(func=bench_filter)
+
+    micro_parser = subparsers.add_parser(
+        "micro", help="Per-call cost of small hot-path helpers"
+    )
+    micro_parser.add_argument("--results", type=int, default=10)
+    micro_parser.add_argument("--calls", type=int, default=2000)
+    micro_parser.add_argument("--repeat", type=int, default=5)
+    micro_parser.set_defaults(func=bench_micro)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Change per benchmark between the last two commits"
+    )
+    compare_parser.add_argument(
+        "--baseline", help="Commit to compare against instead of the previous one"
+    )
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=5.0,
+        help="Percent change flagged as a regression",
+    )
+    compare_parser.set_defaults(func=compare_results)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class CacheMissError(LookupError):
+    """Raised in offline mode when a page is not in the cache."""
+
+
+class PageCache:
+    """
+    On-disk, content-addressed cache of fetched pages.
+
+    Every URL is stored under the SHA-256 of the URL as a gzip-compressed HTML
+    file plus a small JSON metadata file holding the fetch time and the
+    validators (ETag / Last-Modified) needed for conditional revalidation.
+    Entries older than `ttl` seconds are stale; stale entries with validators
+    can be revalidated instead of refetched. When the cache grows past
+    `max_bytes` the least recently used entries are evicted. In `offline`
+    mode stale entries are served as well and misses raise CacheMissError.
+    """
+
+    def __init__(
+        self, cache_dir, ttl=86400, max_bytes=500 * 1024 * 1024, offline=False
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(
+            os.path.getsize(os.path.join(cache_dir, name))
+            for name in os.listdir(cache_dir)
+        )
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.html.gz", f"{base}.json"
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def lookup(self, url):
+        """
+        Returns `(html, meta, fresh)` for a cached URL, or `(None, None, False)`.
+        """
+        html_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+        if meta is None:
+            return None, None, False
+        try:
+            with gzip.open(html_path, "rt", encoding="utf-8") as file:
+                html = file.read()
+        except OSError:
+            return None, None, False
+        # Touch the entry so eviction sees it as recently used.
+        now = time.time()
+        os.utime(meta_path, (now, now))
+        fresh = self.offline or now - meta["fetched_at"] < self.ttl
+        return html, meta, fresh
+
+    def get(self, url):
+        """
+        Returns the cached HTML if it is still fresh, otherwise None. Offline,
+        a missing page raises CacheMissError.
+        """
+        html, _, fresh = self.lookup(url)
+        if html is not None and fresh:
+            return html
+        if self.offline:
+            raise CacheMissError(f"Page not in cache: {url}")
+        return None
+
+    def validators(self, meta):
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def put(self, url, html, etag=None, last_modified=None):
+        html_path, meta_path = self._paths(url)
+        old_size = sum(
+            os.path.getsize(path)
+            for path in (html_path, meta_path)
+            if os.path.isfile(path)
+        )
+        temp_path = f"{html_path}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=6) as file:
+            file.write(html)
+        os.replace(temp_path, html_path)
+        self._write_meta(
+            meta_path,
+            {
+                "url": url,
+                "fetched_at": time.time(),
+                "etag": etag,
+                "last_modified": last_modified,
+            },
+        )
+        new_size = os.path.getsize(html_path) + os.path.getsize(meta_path)
+        with self._lock:
+            self._size += new_size - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url, meta):
+        """Marks a revalidated (304 Not Modified) entry as freshly fetched."""
+        _, meta_path = self._paths(url)
+        self._write_meta(meta_path, {**meta, "fetched_at": time.time()})
+
+    def _write_meta(self, meta_path, meta):
+        temp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(temp_path, meta_path)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                meta_path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(meta_path), meta_path))
+                except OSError:
+                    continue
+        entries.sort()
+
+        # Evict down to 90% of the limit so we don't evict on every write.
+        target = self.max_bytes * 0.9
+        for _, meta_path in entries:
+            if self._size <= target:
+                break
+            html_path = meta_path[: -len(".json")] + ".html.gz"
+            for path in (html_path, meta_path):
+                try:
+                    self._size -= os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    pass
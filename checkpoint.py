@@ -0,0 +1,125 @@
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+def read_links(path):
+    """
+    Returns the `link` column of an output file written by a ResultSink, or an
+    empty list if the file doesn't exist (yet).
+    """
+    if not os.path.isfile(path):
+        return []
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, newline="", encoding="utf-8") as file:
+            return [row.get("link") for row in csv.DictReader(file)]
+    if extension in (".sqlite", ".db"):
+        with sqlite3.connect(path) as connection:
+            return [link for (link,) in connection.execute("SELECT link FROM results")]
+    import pandas as pd
+
+    if extension == ".parquet":
+        return pd.read_parquet(path, columns=["link"])["link"].tolist()
+    if extension == ".feather":
+        return pd.read_feather(path, columns=["link"])["link"].tolist()
+    raise ValueError(f"Unsupported output format: {path}")
+
+
+class CheckpointJournal:
+    """
+    SQLite journal of the (keyword, result page) units of a crawl.
+
+    A unit is `started` once its first row is handed to the sink, together
+    with the file it writes to, and `done` once all of its rows are on disk,
+    with the number of rows written. A resumed run skips done units and sends
+    the rows of started ones to the same file, skipping what is already in it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS units (
+                keyword TEXT,
+                link TEXT,
+                start INTEGER,
+                output TEXT,
+                rows INTEGER,
+                status TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (keyword, link)
+            )
+            """
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def reset(self):
+        """Forgets every unit, for a run that starts over."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM units")
+
+    def _record(self, keyword, link, status, output=None, rows=None):
+        # Imported here so reading outputs (read_links) doesn't load the
+        # scraper.
+        from GScraper import start_offset
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                INSERT INTO units (keyword, link, start, output, rows, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (keyword, link) DO UPDATE SET
+                    output = COALESCE(excluded.output, output),
+                    rows = COALESCE(excluded.rows, rows),
+                    status = excluded.status,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    keyword,
+                    link,
+                    start_offset(link),
+                    output,
+                    rows,
+                    status,
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+
+    def start(self, keyword, link, output):
+        self._record(keyword, link, "started", output=output)
+
+    def complete(self, keyword, link, rows):
+        self._record(keyword, link, "done", rows=rows)
+
+    def units(self, status=None):
+        """Returns `{(keyword, link): (output, rows)}` for units in `status`."""
+        with self._lock:
+            query = "SELECT keyword, link, output, rows FROM units"
+            params = ()
+            if status:
+                query += " WHERE status = ?"
+                params = (status,)
+            return {
+                (keyword, link): (output, rows)
+                for keyword, link, output, rows in self._connection.execute(
+                    query, params
+                )
+            }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,231 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Keyword rules behind the derived filter columns, loaded from config so new
+# categories or keywords don't need a code change.
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+
+# Wraps every keyword match when marking the matches of a text column, see
+# RuleClassifier._keyword_matches.
+MARKER = "\x00"
+
+
+class Rule:
+    """
+    One keyword rule: the fields it reads, its keywords and whether matching
+    is case-sensitive. `regex` tells whether a matched text belongs to it.
+    """
+
+    __slots__ = ("fields", "keywords", "regex", "case_sensitive")
+
+    def __init__(self, fields, keywords, case_sensitive):
+        self.fields = tuple(fields)
+        self.keywords = tuple(keywords)
+        self.regex = re.compile(
+            "|".join(re.escape(keyword) for keyword in keywords),
+            0 if case_sensitive else re.IGNORECASE,
+        )
+        self.case_sensitive = case_sensitive
+
+
+class RuleClassifier:
+    """
+    Derives the boolean flag columns (e.g. `Remote`) and the categorical
+    columns (e.g. `Experience Level`) used by filter.py from keyword rules.
+
+    The keywords of rules reading the same fields are compiled into one
+    alternation that is matched over the whole column in a single pass, so
+    the cost doesn't grow with the number of rules. Each distinct matched
+    text is then checked against the rules, which also credits rules whose
+    keywords lie inside a longer match (e.g. "Engineer" in "Engineering").
+    A match hides a keyword it only partly overlaps, so rules whose keywords
+    can overlap that way ("Senior Software" and "Software Engineer") get
+    separate passes.
+    For categories the first label in config order that matches wins, and
+    rows matching no label get the category's default. Category columns use
+    the pandas `category` dtype.
+    """
+
+    def __init__(self, rules_file=RULES_FILE):
+        with open(rules_file, encoding="utf-8") as file:
+            config = json.load(file)
+        self.version = config.get("version")
+        self.flags = {
+            name: Rule(
+                spec.get("fields", ["title"]),
+                spec["keywords"],
+                spec.get("case_sensitive", False),
+            )
+            for name, spec in config.get("flags", {}).items()
+        }
+        self.categories = {}
+        for name, spec in config.get("categories", {}).items():
+            fields = spec.get("fields", ["title"])
+            case_sensitive = spec.get("case_sensitive", True)
+            labels = [
+                (label["label"], Rule(fields, label["keywords"], case_sensitive))
+                for label in spec["labels"]
+            ]
+            self.categories[name] = (labels, spec.get("default", "All"))
+
+    @property
+    def columns(self):
+        return list(self.flags) + list(self.categories)
+
+    def _text(self, data, fields):
+        text = data[fields[0]].fillna("").astype(str)
+        for field in fields[1:]:
+            text = text + "\n" + data[field].fillna("").astype(str)
+        return text
+
+    @staticmethod
+    def _overlap(first, second, case_sensitive):
+        """
+        Whether a match of `first` can partly overlap one of `second`, i.e.
+        a proper suffix of one is a proper prefix of the other.
+        """
+        if not case_sensitive:
+            first, second = first.lower(), second.lower()
+        return any(
+            a[-size:] == b[:size]
+            for a, b in ((first, second), (second, first))
+            for size in range(1, min(len(a), len(b)))
+        )
+
+    def _passes(self, rules):
+        """
+        Splits `rules` into groups that can share a pass: no keyword of a
+        rule partly overlaps a keyword of another rule in its group.
+        """
+        passes = []
+        for rule in rules:
+            for group in passes:
+                if not any(
+                    self._overlap(
+                        keyword,
+                        other,
+                        rule.case_sensitive and member.case_sensitive,
+                    )
+                    for member in group
+                    for keyword in rule.keywords
+                    for other in member.keywords
+                ):
+                    group.append(rule)
+                    break
+            else:
+                passes.append([rule])
+        return passes
+
+    @staticmethod
+    def _pattern(rules):
+        keywords = {
+            (keyword, rule.case_sensitive)
+            for rule in rules
+            for keyword in rule.keywords
+        }
+        # Longest first, so at any position the longest keyword is matched
+        # and the rules of shorter ones inside it are found in _match_rules.
+        return "|".join(
+            re.escape(keyword) if case_sensitive else f"(?i:{re.escape(keyword)})"
+            for keyword, case_sensitive in sorted(
+                keywords, key=lambda item: (-len(item[0]), item)
+            )
+        )
+
+    def _keyword_matches(self, text, pattern):
+        """
+        Finds all keyword matches in `text` in one pass. Returns the row
+        position of every match, its index into the distinct matched texts
+        and those texts.
+
+        Arrow's regex kernel wraps every match in MARKER, so splitting on it
+        leaves the matches at the odd positions of each row. Plain `re` is
+        the fallback when pyarrow is missing.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+        except ImportError:
+            regex = re.compile(pattern)
+            matches = [
+                (row, match.group())
+                for row, value in enumerate(text)
+                for match in regex.finditer(value)
+            ]
+            rows, texts = zip(*matches) if matches else ((), ())
+            codes, uniques = pd.factorize(pd.Series(texts, dtype=object))
+            return np.array(rows, dtype=np.int64), codes, list(uniques)
+
+        array = pc.replace_substring(pa.array(text, pa.string()), MARKER, "")
+        marked = pc.replace_substring_regex(array, pattern, f"{MARKER}\\0{MARKER}")
+        pieces = pc.split_pattern(marked, MARKER)
+        rows = pc.list_parent_indices(pieces).to_numpy()
+        offsets = pieces.offsets.to_numpy()
+        odd = (np.arange(len(rows)) - offsets[rows]) % 2 == 1
+        texts = pc.list_flatten(pieces).filter(pa.array(odd)).dictionary_encode()
+        return (
+            rows[odd],
+            texts.indices.to_numpy(zero_copy_only=False),
+            texts.dictionary.to_pylist(),
+        )
+
+    def _match_rules(self, data, rules):
+        """
+        Returns a boolean array per rule telling which rows of `data` match
+        it. Rules reading the same fields share one pass over their text
+        unless their keywords can partly overlap, see _passes.
+        """
+        matched = {}
+        by_fields = {}
+        for rule in rules:
+            by_fields.setdefault(rule.fields, []).append(rule)
+        for fields, same_fields in by_fields.items():
+            text = self._text(data, fields)
+            for group in self._passes(same_fields):
+                rows, codes, uniques = self._keyword_matches(text, self._pattern(group))
+                hits = np.array(
+                    [
+                        [rule.regex.search(value) is not None for rule in group]
+                        for value in uniques
+                    ],
+                    dtype=bool,
+                ).reshape(len(uniques), len(group))[codes]
+                for index, rule in enumerate(group):
+                    found = np.zeros(len(data), dtype=bool)
+                    found[rows[hits[:, index]]] = True
+                    matched[rule] = found
+        return matched
+
+    def classify(self, data, columns=None):
+        """
+        Adds the derived `columns` (all of them by default) to `data` in place
+        and returns it.
+        """
+        columns = columns or self.columns
+        rules = []
+        for name in columns:
+            if name in self.flags:
+                rules.append(self.flags[name])
+            elif name in self.categories:
+                rules += [rule for _, rule in self.categories[name][0]]
+            else:
+                raise KeyError(f"No classification rule for column: {name}")
+        matched = self._match_rules(data, rules)
+        for name in columns:
+            if name in self.flags:
+                data[name] = matched[self.flags[name]]
+            else:
+                labels, default = self.categories[name]
+                categories = list(dict.fromkeys([*(l for l, _ in labels), default]))
+                codes = np.select(
+                    [matched[rule] for _, rule in labels],
+                    [categories.index(label) for label, _ in labels],
+                    default=categories.index(default),
+                )
+                data[name] = pd.Categorical.from_codes(codes, categories=categories)
+        return data
@@ -0,0 +1,225 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from.
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "mc_cid",
+    "mc_eid",
+    "igshid",
+    "ref",
+    "ref_src",
+    "ved",
+    "ei",
+    "sa",
+    "usg",
+    "srsltid",
+}
+TRACKING_PREFIXES = ("utm_", "_hs")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url):
+    """
+    Normalizes a URL so that links pointing to the same page compare equal.
+
+    Google redirect links (`/url?q=...`) are unwrapped, the scheme and host are
+    lowercased (http and https are treated alike), default ports, fragments,
+    tracking parameters and trailing slashes are dropped, and the remaining
+    query parameters are sorted. URLs that don't parse (e.g. an out of range
+    port) are returned stripped but otherwise unchanged.
+    """
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    if parts.path == "/url" and "google." in parts.netloc:
+        params = dict(parse_qsl(parts.query))
+        target = params.get("q") or params.get("url")
+        if target:
+            return canonicalize_url(target)
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url.strip()
+    host = (parts.hostname or "").lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS
+        and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized for `capacity` items at the given false
+    positive rate. It never forgets an item but may report an unseen one as
+    present.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class URLIndex:
+    """
+    Set of canonical URLs that have already been scraped.
+
+    Lookups are O(1) against an in-memory set, or against a Bloom filter when
+    `bloom_capacity` is given. With a `path` the index is persisted across
+    runs, either as a SQLite database (`.sqlite`/`.db`) or as a plain text file
+    with one URL per line. For SQLite, Bloom filter hits are confirmed against
+    the database so there are no false positives; a text file index with a
+    Bloom filter accepts the filter's error rate instead.
+    """
+
+    def __init__(self, path=None, bloom_capacity=None, error_rate=0.001):
+        self.path = path
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._file = None
+        self._pending = 0
+        if bloom_capacity:
+            self._seen = BloomFilter(bloom_capacity, error_rate)
+        else:
+            self._seen = set()
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.splitext(path)[1].lower() in (".sqlite", ".db"):
+                self._open_sqlite(path)
+            else:
+                self._open_file(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        if self._connection is not None:
+            with self._lock:
+                return self._connection.execute(
+                    "SELECT COUNT(*) FROM links"
+                ).fetchone()[0]
+        if isinstance(self._seen, set):
+            return len(self._seen)
+        raise TypeError("A Bloom filter backed index does not track its size.")
+
+    def _open_sqlite(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS links (url TEXT PRIMARY KEY)"
+        )
+        if isinstance(self._seen, BloomFilter):
+            for (url,) in self._connection.execute("SELECT url FROM links"):
+                self._seen.add(url)
+        else:
+            self._seen.update(
+                url for (url,) in self._connection.execute("SELECT url FROM links")
+            )
+
+    def _open_file(self, path):
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    url = line.rstrip("\n")
+                    if url:
+                        self._seen.add(url)
+        self._file = open(path, mode="a", encoding="utf-8")
+
+    def _contains(self, url):
+        if url not in self._seen:
+            return False
+        if self._connection is not None and isinstance(self._seen, BloomFilter):
+            return (
+                self._connection.execute(
+                    "SELECT 1 FROM links WHERE url = ?", (url,)
+                ).fetchone()
+                is not None
+            )
+        return True
+
+    def __contains__(self, url):
+        url = canonicalize_url(url)
+        with self._lock:
+            return self._contains(url)
+
+    def add(self, url):
+        """
+        Records `url` and returns True if it had not been seen before.
+        """
+        url = canonicalize_url(url)
+        with self._lock:
+            if self._contains(url):
+                self.hits += 1
+                return False
+            self._seen.add(url)
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO links (url) VALUES (?)", (url,)
+                )
+                self._pending += 1
+                if self._pending >= 100:
+                    self._connection.commit()
+                    self._pending = 0
+            elif self._file is not None:
+                self._file.write(url + "\n")
+            return True
+
+    def flush(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.commit()
+                self._pending = 0
+            elif self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
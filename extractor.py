@@ -0,0 +1,256 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+# Versioned selector config, so a Google class-name change only needs a new
+# entry here rather than a code edit.
+SELECTORS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "selectors.json"
+)
+
+NO_TITLE = "No title found"
+NO_DESCRIPTION = "No description found"
+NO_LINK = "No link found"
+
+ABSOLUTE_DATE = re.compile(r"\d{1,2}\s\w{3}\s\d{4}")
+RELATIVE_DATE = re.compile(r"(\d+)\s*(day|hour|minute)s?\s*ago", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class SearchResult:
+    title: str
+    date: Optional[date]
+    description: str
+    link: str
+    keyword: Optional[str] = None
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "date": self.date,
+            "description": self.description,
+            "keyword": self.keyword,
+            "link": self.link,
+        }
+
+
+def parse_result_date(date_str, today=None):
+    """
+    Parses the date shown next to a Google result, either an absolute date
+    such as "12 Oct 2024" or a relative one such as "3 days ago".
+    """
+    if not date_str:
+        return None
+    date_match = ABSOLUTE_DATE.search(date_str)
+    if date_match:
+        try:
+            return datetime.strptime(date_match.group(), "%d %b %Y").date()
+        except ValueError:
+            return None
+
+    relative_date_match = RELATIVE_DATE.search(date_str)
+    if relative_date_match:
+        today = today or datetime.now().date()
+        number, unit = relative_date_match.groups()
+        unit = unit.lower()
+        if unit == "day":
+            return today - timedelta(days=int(number))
+        elif unit == "hour":
+            return today - timedelta(hours=int(number))
+        return today
+    return None
+
+
+class Selector:
+    """
+    A single element selector from the selector config: a tag name plus
+    required classes and attribute values. `value` names the attribute to
+    return; without it the element's text is used.
+    """
+
+    __slots__ = ("tag", "classes", "attrs", "value", "xpath")
+
+    def __init__(self, spec):
+        self.tag = spec.get("tag")
+        self.classes = frozenset(spec.get("class", "").split())
+        self.attrs = spec.get("attrs", {})
+        self.value = spec.get("value")
+
+        predicates = [
+            f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+            for name in sorted(self.classes)
+        ]
+        predicates += [f"@{key}='{value}'" for key, value in self.attrs.items()]
+        self.xpath = f".//{self.tag or '*'}" + "".join(f"[{p}]" for p in predicates)
+
+    @property
+    def css(self):
+        """The selector as a CSS selector, for querying the DOM in a browser."""
+        return (
+            (self.tag or "*")
+            + "".join(f".{name}" for name in sorted(self.classes))
+            + "".join(f'[{key}="{value}"]' for key, value in self.attrs.items())
+        )
+
+    def matches(self, tag):
+        if self.tag and tag.name != self.tag:
+            return False
+        if self.classes and not self.classes.issubset(tag.get("class") or ()):
+            return False
+        for key, value in self.attrs.items():
+            if tag.get(key) != value:
+                return False
+        return True
+
+
+def load_selectors(path=SELECTORS_FILE, site="google"):
+    with open(path, encoding="utf-8") as file:
+        config = json.load(file)
+    selectors = {name: Selector(spec) for name, spec in config[site].items()}
+    return config.get("version"), selectors
+
+
+class GoogleResultExtractor:
+    """
+    Extracts title, date, description and link from Google result blocks.
+
+    BeautifulSoup blocks are walked once, matching every field selector per
+    node instead of running one `find()` per field. With the "lxml" parser a
+    whole page is handled by compiled XPath expressions without building a
+    BeautifulSoup tree at all.
+    """
+
+    fields = ("title", "date", "description", "link")
+
+    def __init__(self, selectors_file=SELECTORS_FILE, site="google"):
+        self.version, self.selectors = load_selectors(selectors_file, site)
+        self._field_selectors = [(name, self.selectors[name]) for name in self.fields]
+        self._next_page = self.selectors.get("next_page")
+        self._xpaths = None
+
+    def _build_record(self, found, today):
+        title = found.get("title")
+        description = found.get("description")
+        link = found.get("link")
+        return SearchResult(
+            title=title if title is not None else NO_TITLE,
+            date=parse_result_date(found.get("date"), today),
+            description=description if description is not None else NO_DESCRIPTION,
+            link=link if link is not None else NO_LINK,
+        )
+
+    def field_specs(self):
+        """
+        Maps each field to its CSS selector and the attribute holding its
+        value (None for the element's text), see scroll_items.
+        """
+        return {
+            name: [selector.css, selector.value]
+            for name, selector in self._field_selectors
+        }
+
+    def extract_fields(self, items, today=None):
+        """Builds results from field values read in the browser (field_specs)."""
+        today = today or datetime.now().date()
+        return [self._build_record(found, today) for found in items]
+
+    def extract_block(self, block, today=None):
+        found = {}
+        remaining = len(self._field_selectors)
+        for node in block.descendants:
+            if node.name is None:
+                continue
+            for name, selector in self._field_selectors:
+                if name not in found and selector.matches(node):
+                    found[name] = (
+                        node.get(selector.value) if selector.value else node.text
+                    )
+                    remaining -= 1
+            if not remaining:
+                break
+        return self._build_record(found, today)
+
+    def extract_soup(self, soup, today=None):
+        today = today or datetime.now().date()
+        block = self.selectors["result_block"]
+        results = []
+        candidates = soup.find_all(
+            block.tag or True, class_=min(block.classes, default=None)
+        )
+        for result_div in filter(block.matches, candidates):
+            try:
+                results.append(self.extract_block(result_div, today))
+            except Exception as e:
+                print(f"Error extracting search result: {e}")
+        return results
+
+    def _compile_xpaths(self):
+        from lxml import etree
+
+        block_xpath = self.selectors["result_block"].xpath.replace(".//", "//", 1)
+        fields = []
+        for name, selector in self._field_selectors:
+            expression = f"({selector.xpath})[1]"
+            if selector.value:
+                expression += f"/@{selector.value}"
+            fields.append((name, etree.XPath(expression), selector.value))
+        self._xpaths = etree.XPath(block_xpath), fields
+
+    def parse_lxml(self, html):
+        import lxml.html
+
+        try:
+            return lxml.html.fromstring(html)
+        except ValueError:
+            # lxml refuses str input that carries an XML encoding declaration.
+            return lxml.html.fromstring(
+                html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8")
+            )
+
+    def extract_tree(self, tree, today=None):
+        if self._xpaths is None:
+            self._compile_xpaths()
+        block_xpath, field_xpaths = self._xpaths
+        today = today or datetime.now().date()
+        results = []
+        for block in block_xpath(tree):
+            try:
+                found = {}
+                for name, xpath, value in field_xpaths:
+                    matches = xpath(block)
+                    if matches:
+                        found[name] = (
+                            str(matches[0]) if value else matches[0].text_content()
+                        )
+                results.append(self._build_record(found, today))
+            except Exception as e:
+                print(f"Error extracting search result: {e}")
+        return results
+
+    def has_next_page(self, tree):
+        """
+        Whether a parsed page (lxml tree or BeautifulSoup) links to a next
+        result page, or None if the selector config has no `next_page`.
+        """
+        if self._next_page is None:
+            return None
+        if hasattr(tree, "xpath"):
+            return bool(tree.xpath(self._next_page.xpath))
+        return tree.find(self._next_page.matches) is not None
+
+    def extract_lxml(self, html, today=None):
+        return self.extract_tree(self.parse_lxml(html), today)
+
+    def extract_html(
+        self, html, parser="html.parser", today=None
+    ) -> List[SearchResult]:
+        if not html:
+            return []
+        if parser == "lxml":
+            return self.extract_lxml(html, today)
+        from bs4 import BeautifulSoup
+
+        return self.extract_soup(BeautifulSoup(html, parser), today)
@@ -1,49 +1,393 @@
-import pandas as pd
 import argparse
+import os
+import sqlite3
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-# Load the data into a DataFrame
-df = pd.read_csv("data/search_results.csv")
-
-# Convert 'date' column to datetime
-df["date"] = pd.to_datetime(df["date"], errors="coerce")
-
-# Create new columns based on the job titles and descriptions
-df["Remote"] = df["title"].str.contains("Remote", case=False)
-df["Software Engineer"] = df["title"].str.contains("Engineer", case=False)
-df["Developer"] = df["title"].str.contains("Developer", case=False)
-df["Experience Level"] = df["title"].apply(
-    lambda x: (
-        "Junior"
-        if "Junior" in x
-        else ("Senior" if "Senior" in x else ("Staff" if "Staff" in x else "All"))
-    )
-)
-df["Job Type"] = df["title"].apply(
-    lambda x: (
-        "Cloud"
-        if "Cloud" in x
-        else (
-            "AI"
-            if "AI" in x
-            else ("Data Scientist" if "Data Scientist" in x else "All")
+# pandas and the classifier are imported inside the functions that need
+# them, so `--help`, argument errors and `import filter` stay fast.
+
+DEFAULT_INPUT = "data/search_results.csv"
+OUTPUT_FILE = "data/filtered_results.csv"
+
+# main.py's per-keyword result files.
+DEFAULT_PATTERN = "data/*-search-results.*"
+
+# Columns of a search result as main.py writes it; anything else in a file
+# is skipped.
+COLUMNS = ["title", "date", "description", "keyword", "link"]
+
+# Added by validate.py; kept in the output when the input has them.
+LINK_COLUMNS = ["status", "final_url", "checked_at"]
+
+# Output row of the first result of a row's near-duplicate cluster.
+CLUSTER_COLUMN = "cluster_id"
+
+# Loaded on first use, see get_data().
+df = None
+
+
+def load_results(path, columns=COLUMNS):
+    """
+    Loads search results written by main.py in any of its output formats
+    (csv, parquet, feather or sqlite), reading only `columns` and returning
+    the `date` column as datetimes.
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        data = pd.read_csv(
+            path, usecols=lambda column: column in columns, parse_dates=["date"]
         )
-    )
-)
+    elif extension == ".parquet":
+        data = pd.read_parquet(path, columns=columns)
+    elif extension == ".feather":
+        data = pd.read_feather(path, columns=columns)
+    elif extension in (".sqlite", ".db"):
+        with sqlite3.connect(path) as connection:
+            available = {
+                row[1] for row in connection.execute("PRAGMA table_info(results)")
+            }
+            data = pd.read_sql_query(
+                f"SELECT {', '.join(c for c in columns if c in available)} FROM results",
+                connection,
+            )
+    else:
+        raise ValueError(f"Unsupported input format: {path}")
+
+    # Convert 'date' column to datetime
+    data["date"] = pd.to_datetime(data["date"], errors="coerce")
+    return data
+
+
+def iter_results(path, columns=COLUMNS, chunksize=100_000):
+    """
+    Yields the search results in `path` as DataFrames of up to `chunksize`
+    rows, with the same columns and dtypes as load_results().
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        chunks = pd.read_csv(
+            path,
+            usecols=lambda column: column in columns,
+            parse_dates=["date"],
+            chunksize=chunksize,
+        )
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(path).iter_batches(
+            batch_size=chunksize, columns=columns
+        )
+        chunks = (batch.to_pandas() for batch in batches)
+    elif extension == ".feather":
+        import pyarrow as pa
+
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        chunks = (
+            reader.get_batch(i).select(columns).to_pandas()
+            for i in range(reader.num_record_batches)
+        )
+    elif extension in (".sqlite", ".db"):
+        connection = sqlite3.connect(path)
+        available = {row[1] for row in connection.execute("PRAGMA table_info(results)")}
+        chunks = pd.read_sql_query(
+            f"SELECT {', '.join(c for c in columns if c in available)} FROM results",
+            connection,
+            chunksize=chunksize,
+        )
+    else:
+        raise ValueError(f"Unsupported input format: {path}")
+
+    try:
+        for chunk in chunks:
+            chunk["date"] = pd.to_datetime(chunk["date"], errors="coerce")
+            yield chunk
+    finally:
+        if extension in (".sqlite", ".db"):
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_classifier(rules_file=None):
+    from classifier import RuleClassifier, RULES_FILE
+
+    return RuleClassifier(rules_file or RULES_FILE)
+
+
+def add_derived_columns(data, columns=None, rules_file=None):
+    """
+    Adds the derived filter columns in `columns` (all of them by default) that
+    `data` doesn't have yet and returns it.
+    """
+    classifier = get_classifier(rules_file)
+    missing = [
+        column
+        for column in (columns if columns is not None else classifier.columns)
+        if column not in data.columns
+    ]
+    if missing:
+        classifier.classify(data, missing)
+    return data
+
+
+def load_data(path=DEFAULT_INPUT):
+    global df
+    df = load_results(path)
+    return df
+
+
+def get_data():
+    if df is None:
+        load_data()
+    return df
 
 
 # Function to filter DataFrame in ascending order
 def filter_asc(column_name):
-    return df.sort_values(by=column_name, ascending=True)
+    return add_derived_columns(get_data(), [column_name]).sort_values(
+        by=column_name, ascending=True
+    )
 
 
 # Function to filter DataFrame in descending order
 def filter_desc(column_name):
-    return df.sort_values(by=column_name, ascending=False)
+    return add_derived_columns(get_data(), [column_name]).sort_values(
+        by=column_name, ascending=False
+    )
+
+
+def apply_filters(data, args):
+    # Apply date filter first, it is cheap and shrinks the rows left to classify
+    if args.date_after:
+        date_after = datetime.strptime(args.date_after, "%Y-%m-%d")
+        data = data[data["date"] >= date_after]
+    elif args.days_ago:
+        date_after = datetime.now() - timedelta(days=args.days_ago)
+        data = data[data["date"] >= date_after]
+    if args.keyword:
+        data = data[data["keyword"] == args.keyword]
+    if args.link_status != "all":
+        from validate import add_link_status, link_health
+
+        if "status" not in data.columns:
+            data = add_link_status(data.copy(), args.links_db)
+        data = data[link_health(data["status"], args.link_status)]
+
+    # Derive only the columns the chosen filters need
+    needed = []
+    if args.remote != "all":
+        needed.append("Remote")
+    if args.role != "all":
+        needed.append(args.role)
+    if args.experience != "all":
+        needed.append("Experience Level")
+    if args.job_type != "all":
+        needed.append("Job Type")
+    # Copy only to add columns, data that has them all is filtered as it is
+    if any(column not in data.columns for column in needed):
+        data = add_derived_columns(data.copy(), needed, args.rules)
+
+    # Apply filters
+    if args.remote != "all":
+        data = data[data["Remote"] == (args.remote == "yes")]
+    if args.role != "all":
+        data = data[data[args.role]]
+    if args.experience != "all":
+        data = data[data["Experience Level"].isin([args.experience, "All"])]
+    if args.job_type != "all":
+        data = data[data["Job Type"].isin([args.job_type, "All"])]
+    return data
+
+
+def drop_near_duplicates(data, args, index=None):
+    """
+    With `--near_duplicates drop`, keeps only the first result of every
+    cluster of near-duplicates. Pass an `index` to carry the clusters over
+    from earlier chunks.
+    """
+    if args.near_duplicates != "drop":
+        return data
+    from neardup import add_cluster_ids
+
+    data = add_cluster_ids(data, index, args.near_dup_threshold, drop=True)
+    return data.drop(columns=CLUSTER_COLUMN)
+
+
+def cluster_threshold(args):
+    """The threshold for `cluster_id` with --near_duplicates mark, else None."""
+    return args.near_dup_threshold if args.near_duplicates == "mark" else None
+
+
+def finalize_columns(data, rules_file=None, threshold=None, index=None):
+    """
+    Orders the output columns. With a near-duplicate `threshold` the rows
+    also get a `cluster_id`; pass an `index` to carry the clusters over from
+    earlier chunks.
+    """
+    # The remaining derived columns are only computed for the rows written out
+    data = add_derived_columns(data.copy(), rules_file=rules_file)
+    cluster_columns = []
+    if threshold is not None:
+        from neardup import add_cluster_ids
+
+        data = add_cluster_ids(data, index, threshold)
+        cluster_columns = [CLUSTER_COLUMN]
+    base_columns = [column for column in data.columns if column in COLUMNS]
+    link_columns = [column for column in LINK_COLUMNS if column in data.columns]
+    return data[
+        base_columns
+        + link_columns
+        + cluster_columns
+        + get_classifier(rules_file).columns
+    ]
+
+
+def stream_filter(args):
+    """
+    Filters the input chunk by chunk so memory stays flat whatever its size.
+
+    Matching rows are appended to the output as each chunk is processed. With
+    `--sort` and `--limit` only the current top `limit` rows are kept between
+    chunks; `--sort` without `--limit` has to keep every matching row, which
+    are sorted once at the end. Near-duplicates are found in sorted output
+    once it is sorted; unsorted, one index lives across chunks, so clusters
+    span them.
+    """
+    import pandas as pd
+
+    ascending = args.order == "asc"
+    top = None
+    collected = []
+    written = 0
+    threshold = cluster_threshold(args)
+    # Indexes for the unsorted path: `seen` drops near-duplicates, `clusters`
+    # marks them.
+    seen = clusters = None
+    if args.sort == "none" and args.near_duplicates != "off":
+        from neardup import NearDuplicateIndex
+
+        index = NearDuplicateIndex(args.near_dup_threshold)
+        if args.near_duplicates == "drop":
+            seen = index
+        else:
+            clusters = index
+    for chunk in iter_results(args.input, chunksize=args.chunksize):
+        matches = apply_filters(chunk, args)
+        if args.sort != "none" and not args.limit:
+            collected.append(matches)
+            continue
+        if args.sort != "none":
+            top = matches if top is None else pd.concat([top, matches])
+            top = top.sort_values(by=args.sort, ascending=ascending, kind="stable")
+            # Dropped again from scratch, as new rows can sort before the
+            # first result of a cluster.
+            top = drop_near_duplicates(top, args).head(args.limit)
+            continue
+
+        matches = drop_near_duplicates(matches, args, seen)
+        if args.limit:
+            matches = matches.head(args.limit - written)
+        matches = finalize_columns(matches, args.rules, threshold, clusters)
+        matches.to_csv(
+            OUTPUT_FILE,
+            mode="w" if written == 0 else "a",
+            header=written == 0,
+            index=False,
+        )
+        written += len(matches)
+        if args.limit and written >= args.limit:
+            break
+
+    if args.sort != "none":
+        if collected:
+            top = pd.concat(collected).sort_values(
+                by=args.sort, ascending=ascending, kind="stable"
+            )
+            top = drop_near_duplicates(top, args)
+        if top is None:
+            top = apply_filters(pd.DataFrame(columns=COLUMNS), args)
+        top = finalize_columns(top, args.rules, threshold)
+        print(top[["title", "date", "description", "link"]])
+        top.to_csv(OUTPUT_FILE, index=False)
+        written = len(top)
+    elif written == 0:
+        finalize_columns(
+            apply_filters(pd.DataFrame(columns=COLUMNS), args), args.rules, threshold
+        ).to_csv(OUTPUT_FILE, index=False)
+
+    print(f"{written} filtered results saved to '{OUTPUT_FILE}'")
+
+
+def query_store(args):
+    """
+    Runs the filters as one indexed query against a store built with
+    `store.py ingest`. If the store was classified with other rules than
+    `--rules`, only the date, keyword and full-text predicates run in SQL and
+    the rest is applied here.
+    """
+    from store import ResultStore
+
+    with ResultStore(args.store, args.rules) as store:
+        if args.date_after:
+            date_after = args.date_after
+        elif args.days_ago:
+            date_after = datetime.now() - timedelta(days=args.days_ago)
+            date_after = date_after.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            date_after = None
+        query = dict(
+            date_after=date_after,
+            keyword=args.keyword,
+            search=args.search,
+            link_status=None if args.link_status == "all" else args.link_status,
+            sort=None if args.sort == "none" else args.sort,
+            ascending=args.order == "asc",
+        )
+        if not store.rules_match(args.rules):
+            print(f"'{args.store}' was built with other rules, re-run store.py ingest")
+            data = store.query(derived=False, **query)
+            args.date_after = args.days_ago = args.keyword = None
+            args.link_status = "all"
+            data = drop_near_duplicates(apply_filters(data, args), args)
+            return data.head(args.limit) if args.limit else data
+
+        flags, categories = {}, {}
+        if args.remote != "all":
+            flags["Remote"] = args.remote == "yes"
+        if args.role != "all":
+            flags[args.role] = True
+        if args.experience != "all":
+            categories["Experience Level"] = [args.experience, "All"]
+        if args.job_type != "all":
+            categories["Job Type"] = [args.job_type, "All"]
+        if args.near_duplicates == "drop":
+            # The limit applies once the copies are gone.
+            data = store.query(flags=flags, categories=categories, **query)
+            data = drop_near_duplicates(data, args)
+            return data.head(args.limit) if args.limit else data
+        return store.query(
+            flags=flags, categories=categories, limit=args.limit, **query
+        )
 
 
 def main():
     parser = argparse.ArgumentParser(description="Filter and sort job listings.")
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=DEFAULT_INPUT,
+        help="Search results to filter (.csv, .parquet, .feather or .sqlite)",
+    )
+    parser.add_argument(
+        "--rules",
+        type=str,
+        default=None,
+        help="JSON file with the keyword rules behind the derived columns (default: rules.json)",
+    )
     parser.add_argument(
         "--remote",
         choices=["yes", "no", "all"],
@@ -92,46 +436,99 @@ def main():
     parser.add_argument(
         "--days_ago", type=int, default=None, help="Filter jobs from the last N days"
     )
+    parser.add_argument(
+        "--keyword", type=str, default=None, help="Only results for this keyword"
+    )
+    parser.add_argument(
+        "--link_status",
+        choices=["ok", "broken", "unchecked", "all"],
+        default="all",
+        help="Filter on the link checks of `validate.py`",
+    )
+    parser.add_argument(
+        "--links_db",
+        type=str,
+        default="data/link-status.sqlite",
+        help="Link check cache written by `validate.py` (for --input files)",
+    )
+    parser.add_argument(
+        "--near_duplicates",
+        choices=["off", "mark", "drop"],
+        default="off",
+        help="Mark near-duplicate results with a shared cluster_id, or keep "
+        "just the first of each cluster (both cost a MinHash per output row)",
+    )
+    parser.add_argument(
+        "--near_dup_threshold",
+        type=float,
+        default=0.9,
+        help="Estimated Jaccard similarity of two results' text shingles above "
+        "which they are near-duplicates",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Query an indexed store built with `store.py ingest` instead of --input",
+    )
+    parser.add_argument(
+        "--search",
+        type=str,
+        default=None,
+        help="Full-text search over title and description (needs --store)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process the input in chunks to keep memory flat on large histories",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=100_000,
+        help="Rows per chunk in --stream mode",
+    )
 
     args = parser.parse_args()
+    if args.search and not args.store:
+        parser.error("--search needs an indexed --store")
 
-    # Apply filters
-    filtered_df = df.copy()
-    if args.remote != "all":
-        filtered_df = filtered_df[filtered_df["Remote"] == (args.remote == "yes")]
-    if args.role != "all":
-        filtered_df = filtered_df[filtered_df[args.role]]
-    if args.experience != "all":
-        filtered_df = filtered_df[
-            filtered_df["Experience Level"].isin([args.experience, "All"])
-        ]
-    if args.job_type != "all":
-        filtered_df = filtered_df[filtered_df["Job Type"].isin([args.job_type, "All"])]
+    if args.store:
+        filtered_df = finalize_columns(
+            query_store(args), args.rules, cluster_threshold(args)
+        )
+        print(filtered_df[["title", "date", "description", "link"]])
+        filtered_df.to_csv(OUTPUT_FILE, index=False)
+        print(f"Filtered results saved to '{OUTPUT_FILE}'")
+        return
 
-    # Apply date filter
-    if args.date_after:
-        date_after = datetime.strptime(args.date_after, "%Y-%m-%d")
-        filtered_df = filtered_df[filtered_df["date"] >= date_after]
-    elif args.days_ago:
-        date_after = datetime.now() - timedelta(days=args.days_ago)
-        filtered_df = filtered_df[filtered_df["date"] >= date_after]
+    if args.stream:
+        stream_filter(args)
+        return
+
+    filtered_df = apply_filters(load_data(args.input), args)
 
     # Sort the DataFrame
     if args.sort != "none":
+        # Stable, as in stream_filter, so ties keep their input order in both.
         filtered_df = filtered_df.sort_values(
-            by=args.sort, ascending=(args.order == "asc")
+            by=args.sort, ascending=(args.order == "asc"), kind="stable"
         )
 
+    filtered_df = drop_near_duplicates(filtered_df, args)
+
     # Limit the number of results if specified
     if args.limit:
         filtered_df = filtered_df.head(args.limit)
 
+    filtered_df = finalize_columns(filtered_df, args.rules, cluster_threshold(args))
+
     # Display results
     print(filtered_df[["title", "date", "description", "link"]])
 
     # Optionally, save the filtered results to a new CSV file
-    filtered_df.to_csv("data/filtered_results.csv", index=False)
-    print(f"Filtered results saved to 'data/filtered_results.csv'")
+    filtered_df.to_csv(OUTPUT_FILE, index=False)
+    print(f"Filtered results saved to '{OUTPUT_FILE}'")
 
 
 if __name__ == "__main__":
@@ -8,72 +8,477 @@ import cProfile
 import pstats
 import utils
 import GScraper
+from utils import (
+    WebDriverPool,
+    RateLimiter,
+    HostLimiter,
+    create_sink,
+    wait_until_ready,
+    scroll_items,
+    GOOGLE_RESULT_MARKER,
+    PARSERS,
+)
+from dedup import URLIndex, canonicalize_url
+from checkpoint import CheckpointJournal, read_links
+from extractor import NO_TITLE, NO_LINK
+from cache import PageCache, CacheMissError
+from pipeline import Pipeline, Stage
+from metrics import metrics
+from resilience import CircuitBreaker, FetchError, Resilience
 from urllib.parse import quote
-import time
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from collections import namedtuple
 import argparse
+import asyncio
+import queue
+import signal
+import sys
+import threading
 
 utils = utils.ScraperUtils()
 
 
-def scraper_func(driver, soup):
-    def check_number_of_articles_present(
-        class_to_check="e1ln2bfr2 css-1wzidz4 ebqqd5k1",
-    ):
-        elements_with_class = soup.find_all(class_=class_to_check)
-        return len(elements_with_class)
+# Handed down the pipeline after a result page's last result. `valid` is
+# False for pages without result blocks (e.g. a CAPTCHA).
+PageEnd = namedtuple("PageEnd", ["valid", "has_next"])
 
-    try:
-        time.sleep(5)
-        total_number_of_articles = soup.find(
-            "span", {"data-qa": "SearchResultList-TotalCount"}
-        )
-        total_count = int(total_number_of_articles.text)
-        loaded_news_articles = check_number_of_articles_present()
+# SCMP search result list, see scraper_func.
+SCMP_TOTAL_COUNT = 'span[data-qa="SearchResultList-TotalCount"]'
+SCMP_ARTICLE = ".e1ln2bfr2.css-1wzidz4.ebqqd5k1"
 
-        while total_count > loaded_news_articles:
-            page_source = driver.page_source
-            soup = BeautifulSoup(page_source, "html.parser")
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            driver.execute_script("return document.body.scrollHeight")
-            loaded_news_articles = check_number_of_articles_present()
 
+def scraper_func(driver, soup):
+    try:
+        wait_until_ready(driver, selector=SCMP_TOTAL_COUNT)
+        total_count = int(
+            driver.execute_script(
+                "return document.querySelector(arguments[0]).textContent",
+                SCMP_TOTAL_COUNT,
+            )
+        )
+        # Only the item count matters here; the articles are extracted from
+        # the final page source.
+        for _ in scroll_items(driver, SCMP_ARTICLE, total=total_count):
+            pass
         return driver.page_source
     except Exception as err:
         print(err)
 
 
+def fetch_search_page(args, pool, paginated_link):
+    if args.fetch_mode in ("http", "auto"):
+        # Without result blocks the page most likely needs JavaScript (or is a
+        # consent/CAPTCHA page), so auto mode retries it in a real browser
+        # and keeps it out of the cache.
+        has_results = lambda html: GOOGLE_RESULT_MARKER in html
+        html = utils.request_html(
+            paginated_link, None if args.fetch_mode == "http" else has_results
+        )
+        if args.fetch_mode == "http" or has_results(html):
+            return html
+        print(f"No results in HTTP response, falling back to browser: {paginated_link}")
+        metrics.incr("retries")
+
+    def load():
+        # A driver that crashed is discarded by the pool, so a retry gets a
+        # new one.
+        with pool.driver() as driver:
+            return utils.request_html_with_web_driver(
+                paginated_link,
+                args.headless,
+                args.browser_agent,
+                driver=driver,
+                # Whatever is cached is what the browser is meant to replace.
+                read_cache=args.fetch_mode != "auto",
+            )
+
+    return utils.resilience.call(paginated_link, load)
+
+
+def fetch_search_html(args, pool, paginated_link, host_limiter, rate_limiter):
+    with host_limiter.limit(paginated_link):
+        try:
+            # Cached pages skip the rate limiter and never borrow a browser.
+            html = utils.get_cached_html(paginated_link)
+            if html is None:
+                rate_limiter.wait()
+                html = fetch_search_page(args, pool, paginated_link)
+        except (CacheMissError, FetchError) as err:
+            metrics.incr("errors")
+            print(err)
+            return None
+    metrics.incr("pages")
+    return html
+
+
+def extract_search_page(args, html, search_keyword):
+    # The search keyword when no extra terms were given, so every result
+    # can be told apart by keyword once files are merged (see store.py).
+    keyword = (
+        args.all_these_words
+        or args.exact_phrase
+        or args.any_of_these_words
+        or search_keyword
+    )
+    results = []
+    found, has_next = utils.extract_google_search_page(html)
+    for result in found:
+        if result.title != NO_TITLE:
+            result.keyword = keyword
+            results.append(result)
+    return results, has_next
+
+
+def stream_search_pages(args, pool, jobs, rate_limiter, paginator, halted):
+    """
+    Yields `(keyword, paginated_link, html)` for the async engine as pages
+    come in. The event loop runs in its own thread and each keyword walks its
+    pages with GScraper.walk_pages, so a keyword's next page is only
+    requested while `paginator` still wants it. At most --queue_size fetched
+    pages wait for the pipeline; the walk is cancelled once `halted()`.
+    """
+    # Plain HTTP goes through the async client; browser and auto modes run the
+    # blocking fetch in worker threads driven by the same event loop.
+    fetch = None
+    if args.fetch_mode != "http":
+        fetch = lambda paginated_link: fetch_search_page(args, pool, paginated_link)
+    ahead = args.pages_ahead or args.workers
+    if paginator is not None and not args.pages_ahead:
+        # Keeps --workers pages in flight over all keywords, while wasting
+        # at most a few requests past each keyword's end.
+        keywords = {keyword for keyword, _ in jobs}
+        ahead = max(1, args.workers // max(1, len(keywords)))
+    pages = queue.Queue(args.queue_size)
+    stopped = threading.Event()
+    errors = []
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def on_page(keyword, paginated_link, html):
+        if isinstance(html, BaseException):
+            metrics.incr("errors")
+            print(f"Error fetching {paginated_link}: {html!r}")
+            return
+        metrics.incr("pages")
+        if not put((keyword, paginated_link, html)):
+            raise RuntimeError("Search pages are no longer consumed")
+
+    async def walk():
+        task = asyncio.create_task(
+            GScraper.walk_pages(
+                jobs,
+                on_page,
+                paginator,
+                ahead,
+                concurrency=args.workers,
+                per_host=args.max_per_host,
+                timeout=args.request_timeout,
+                rate_limiter=rate_limiter,
+                cache=utils.cache,
+                fetch=fetch,
+                resilience=utils.resilience,
+            )
+        )
+        # Pages handed on are waited for until they are recorded, which
+        # never happens once the pipeline has stopped.
+        while not stopped.is_set():
+            done, _ = await asyncio.wait([task], timeout=0.1)
+            if done:
+                return task.result()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return 0
+
+    def crawl():
+        try:
+            metrics.incr("pages_skipped", asyncio.run(walk()))
+        except BaseException as err:
+            errors.append(err)
+        finally:
+            put(None)
+
+    thread = threading.Thread(target=crawl, name="search-pages", daemon=True)
+    thread.start()
+    try:
+        while not halted():
+            try:
+                item = pages.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
 def web_search(args):
     today = datetime.now().date()
+    jobs = []
     for keyword in args.keywords:
         search_string = create_search_string(args, keyword)
         gscraper = GScraper.GScapper(
-            search_string, args.max_results, headless=args.headless
+            search_string, args.max_results, headless=args.headless, page_size=args.num
+        )
+        for paginated_link in gscraper.construct_search_urls(0):
+            jobs.append((keyword, paginated_link))
+
+    journal = CheckpointJournal(args.checkpoint) if args.checkpoint else None
+    partial = {}
+    if journal is not None and args.resume:
+        done = journal.units("done")
+        partial = journal.units("started")
+        jobs = [job for job in jobs if job not in done]
+        print(
+            f"Resuming: {len(done)} pages done, {len(partial)} partially written, "
+            f"{len(jobs)} to fetch"
         )
-        paginated_links = gscraper.construct_search_urls(0)
-        for paginated_link in paginated_links:
-            soup = utils.request_page_with_web_driver(
-                paginated_link, args.headless, args.browser_agent
+    elif journal is not None:
+        journal.reset()
+
+    paginator = None
+    if args.pagination == "adaptive":
+        paginator = GScraper.PaginationTracker(args.max_duplicate_ratio)
+
+    host_limiter = HostLimiter(args.max_per_host)
+    rate_limiter = RateLimiter(args.request_interval)
+    metrics.reset()
+    metrics.start_progress(args.progress_interval)
+    try:
+        with URLIndex(
+            args.dedup_index or None, bloom_capacity=args.bloom_capacity
+        ) as visited_links, create_sink(
+            args.output_format,
+            batch_size=args.flush_rows,
+            flush_interval=args.flush_interval,
+        ) as sink, WebDriverPool(
+            args.browser_agent,
+            args.headless,
+            size=args.workers,
+            max_uses=args.driver_max_uses,
+            # The async engine can't cancel a page loading in a thread.
+            page_load_timeout=args.request_timeout if args.engine == "async" else None,
+        ) as pool:
+            utils.visited_links = visited_links
+            utils.parser = args.parser
+            utils.pool_size = args.workers
+            utils.resilience = Resilience(
+                max_retries=args.max_retries,
+                backoff_base=args.backoff_base,
+                backoff_max=args.backoff_max,
+                max_pause=args.max_pause,
+                breaker=CircuitBreaker(
+                    failure_threshold=args.breaker_threshold,
+                    cooldown=args.breaker_cooldown,
+                ),
             )
-            result_divs = soup.find_all("div", class_="MjjYud")
-            for result_div in result_divs:
-                extracted_data = utils.extract_google_search_result(result_div)
-                if extracted_data and extracted_data["title"] != "No title found":
-                    extracted_data["keyword"] = (
-                        args.all_these_words
-                        or args.exact_phrase
-                        or args.any_of_these_words
+            if args.cache_dir:
+                utils.cache = PageCache(
+                    args.cache_dir, ttl=args.cache_ttl, offline=args.offline
+                )
+
+            # Links written in this run. They only go into the persistent
+            # index once their page is complete, so links of a page that was
+            # cut short are written again by --resume instead of being lost.
+            seen = set()
+            for output in {output for output, _ in partial.values() if output}:
+                seen.update(canonicalize_url(link) for link in read_links(output))
+            near_duplicates = None
+            if args.near_duplicates == "drop":
+                # Imported here, numpy would slow down every start otherwise.
+                from neardup import NearDuplicateIndex
+
+                near_duplicates = NearDuplicateIndex(args.near_dup_threshold)
+            unit_links = {}
+            page_links = {}
+            # Rows handed to the sink per file, and the finished pages waiting
+            # for their last row to be flushed.
+            submitted = {}
+            pending = []
+
+            def wanted(keyword, paginated_link):
+                return paginator is None or paginator.wanted(
+                    keyword, GScraper.start_offset(paginated_link)
+                )
+
+            def fetch(job):
+                keyword, paginated_link = job
+                if not wanted(keyword, paginated_link):
+                    metrics.incr("pages_skipped")
+                    return
+                html = fetch_search_html(
+                    args, pool, paginated_link, host_limiter, rate_limiter
+                )
+                if html is not None:
+                    yield keyword, paginated_link, html
+
+            def extract(page):
+                keyword, paginated_link, html = page
+                try:
+                    results, has_next = extract_search_page(args, html, keyword)
+                except Exception as err:
+                    # The page is left unfinished for --resume, the rest of
+                    # the run goes on.
+                    metrics.incr("errors")
+                    print(f"Error extracting {paginated_link}: {err!r}")
+                    if paginator is not None:
+                        paginator.settle(keyword, GScraper.start_offset(paginated_link))
+                    return
+                for result in results:
+                    yield keyword, paginated_link, result
+                yield keyword, paginated_link, PageEnd(
+                    GOOGLE_RESULT_MARKER in html, has_next
+                )
+
+            def dedup(item):
+                keyword, paginated_link, result = item
+                if not wanted(keyword, paginated_link):
+                    # Fetched before an earlier page ended the keyword.
+                    if isinstance(result, PageEnd):
+                        metrics.incr("pages_skipped")
+                    return
+                if isinstance(result, PageEnd):
+                    links = page_links.pop(paginated_link, [])
+                    # Pages without result blocks end the keyword too: past
+                    # the last page, Google serves none. A CAPTCHA would stop
+                    # it early, but its pages are left for --resume to retry.
+                    if paginator is not None:
+                        paginator.record(
+                            keyword,
+                            GScraper.start_offset(paginated_link),
+                            links,
+                            result.has_next,
+                        )
+                    yield item
+                    return
+                link = None
+                if result.link != NO_LINK:
+                    link = canonicalize_url(result.link)
+                    page_links.setdefault(paginated_link, []).append(link)
+                    if link in seen or link in visited_links:
+                        metrics.incr("dedup_hits")
+                        return
+                    seen.add(link)
+                if near_duplicates is not None:
+                    record_id, cluster_id = near_duplicates.add_result(
+                        result.title, result.description
                     )
-                    print(extracted_data)
-                    utils.write_data_to_csv(
-                        [extracted_data],
-                        f"./data/{keyword.replace(' ', '-')}-{today}-search-results.csv",
+                    if record_id != cluster_id:
+                        metrics.incr("near_dup_hits")
+                        # Indexed as scraped right away, so later runs skip
+                        # the copy too once the original is in the index.
+                        if link is not None:
+                            visited_links.add(link)
+                        return
+                yield item
+
+            def complete(keyword, paginated_link, links):
+                for link in links:
+                    if link != NO_LINK:
+                        visited_links.add(link)
+                if journal is not None:
+                    journal.complete(keyword, paginated_link, len(links))
+
+            def complete_flushed(closed=False):
+                # Pages are marked done with the batch that flushed their
+                # last row, so --flush_rows and --flush_interval are kept.
+                # Columnar files only land on disk when the sink is closed.
+                if not closed and not sink.durable_flush:
+                    return
+                for unit in list(pending):
+                    filename, rows = unit[:2]
+                    if sink.flushed_rows(filename) >= rows:
+                        pending.remove(unit)
+                        complete(*unit[2:])
+
+            def write(item):
+                keyword, paginated_link, result = item
+                filename = partial.get((keyword, paginated_link), (None,))[0] or (
+                    f"./data/{keyword.replace(' ', '-')}-{today}-search-results{sink.extension}"
+                )
+                if isinstance(result, PageEnd):
+                    links = unit_links.pop(paginated_link, [])
+                    # Pages without result blocks are never marked done, so
+                    # --resume retries them.
+                    if not result.valid:
+                        return ()
+                    pending.append(
+                        (
+                            filename,
+                            submitted.get(filename, 0),
+                            keyword,
+                            paginated_link,
+                            links,
+                        )
                     )
+                    complete_flushed()
+                    return ()
+
+                if paginated_link not in unit_links:
+                    unit_links[paginated_link] = []
+                    if journal is not None:
+                        journal.start(keyword, paginated_link, filename)
+                unit_links[paginated_link].append(result.link)
+                extracted_data = result.to_dict()
+                print(extracted_data)
+                metrics.incr("results")
+                sink.write(filename, [extracted_data])
+                submitted[filename] = submitted.get(filename, 0) + 1
+                complete_flushed()
+                return ()
+
+            # Every stage hands its output on in job order, so each keyword's file
+            # is written in the same order as a sequential run.
+            stages = [
+                Stage("extract", extract, args.parse_workers, args.queue_size),
+                Stage("dedup", dedup, 1, args.queue_size),
+                Stage("write", write, 1, args.queue_size),
+            ]
+            if args.engine == "async":
+                source = stream_search_pages(
+                    args, pool, jobs, rate_limiter, paginator, lambda: pipeline.stopped
+                )
+            else:
+                source = jobs
+                stages.insert(0, Stage("fetch", fetch, args.workers, args.queue_size))
+            pipeline = Pipeline(source, stages)
+            pipeline.run()
+
+            if pending:
+                sink.close()
+                complete_flushed(closed=True)
+    finally:
+        # After the sinks are closed, so their final flush is included.
+        metrics.stop_progress()
+        write_metrics(args)
+        if journal is not None:
+            journal.close()
+    print(f"Skipped {metrics.counters['dedup_hits']} results that were already scraped")
+    if metrics.counters["near_dup_hits"]:
+        print(f"Dropped {metrics.counters['near_dup_hits']} near-duplicate results")
+
+
+def write_metrics(args):
+    print(metrics.progress_line())
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+        print(f"Run metrics saved to '{args.metrics_json}'")
+    if args.prometheus_file:
+        metrics.write_prometheus(args.prometheus_file)
 
 
 def create_search_string(args, keyword):
-    base_url = "https://www.google.com/search?"
+    base_url = args.search_url
     params = {
         "q": quote(keyword),
         "as_q": args.all_these_words,
@@ -116,6 +521,27 @@ def main():
         default=70,
         help="Maximum number of results per keyword",
     )
+    parser.add_argument(
+        "--num",
+        type=int,
+        choices=[10, 100],
+        default=10,
+        help="Results requested per search page (100 needs ~10x fewer requests)",
+    )
+    parser.add_argument(
+        "--pagination",
+        choices=["adaptive", "fixed"],
+        default="adaptive",
+        help="Stop requesting a keyword's pages once its results run out, or "
+        "always request every page up to --max_results",
+    )
+    parser.add_argument(
+        "--max_duplicate_ratio",
+        type=float,
+        default=0.8,
+        help="Share of a page's results already seen for its keyword that ends "
+        "adaptive pagination",
+    )
     parser.add_argument(
         "--days_ago",
         type=int,
@@ -129,7 +555,211 @@ def main():
         help="Browser agent to use for scraping",
     )
     parser.add_argument("--headless", action="store_true", help="Run in headless mode")
+    parser.add_argument(
+        "--fetch_mode",
+        "--fetch-mode",
+        choices=["http", "browser", "auto"],
+        default="browser",
+        help="Fetch pages over plain HTTP, in a browser, or over HTTP with a browser fallback",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=PARSERS,
+        default="lxml",
+        help="HTML parser used by BeautifulSoup",
+    )
+    parser.add_argument(
+        "--search_url",
+        type=str,
+        default="https://www.google.com/search?",
+        help="Search endpoint, e.g. a local server replaying saved result pages",
+    )
+    parser.add_argument(
+        "--driver_max_uses",
+        type=int,
+        default=10,
+        help="Number of pages a pooled browser serves before it is relaunched (0 for no limit)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of result pages to fetch concurrently",
+    )
+    parser.add_argument(
+        "--parse_workers",
+        type=int,
+        default=2,
+        help="Number of fetched pages to parse and extract concurrently",
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=16,
+        help="Items waiting between pipeline stages before the previous stage blocks",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="Run fetches on a thread pool or on the asyncio engine",
+    )
+    parser.add_argument(
+        "--pages_ahead",
+        type=int,
+        default=None,
+        help="Pages of a keyword fetched at once by the async engine (default: "
+        "--workers, split across keywords with adaptive pagination)",
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=3,
+        help="Retries of a fetch that timed out, was rate limited or crashed",
+    )
+    parser.add_argument(
+        "--backoff_base",
+        type=float,
+        default=1.0,
+        help="Upper bound in seconds of the first retry's jittered backoff, "
+        "doubled for every further retry",
+    )
+    parser.add_argument(
+        "--backoff_max",
+        type=float,
+        default=30.0,
+        help="Maximum seconds to back off before a retry",
+    )
+    parser.add_argument(
+        "--breaker_threshold",
+        type=float,
+        default=0.5,
+        help="Share of a host's last 20 requests that must fail to pause it",
+    )
+    parser.add_argument(
+        "--breaker_cooldown",
+        type=float,
+        default=30.0,
+        help="Seconds a host is paused for before a trial request",
+    )
+    parser.add_argument(
+        "--max_pause",
+        type=float,
+        default=120.0,
+        help="Seconds a fetch waits on a paused host before failing",
+    )
+    parser.add_argument(
+        "--request_timeout",
+        type=float,
+        default=30.0,
+        help="Seconds before a single fetch is cancelled (async engine)",
+    )
+    parser.add_argument(
+        "--max_per_host",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent requests to a single host",
+    )
+    parser.add_argument(
+        "--request_interval",
+        type=float,
+        default=1.0,
+        help="Minimum number of seconds between the start of two requests",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory for the on-disk page cache (disabled when not set)",
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        "--cache-ttl",
+        type=int,
+        default=86400,
+        help="Seconds a cached page is served without revalidation",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only serve pages from the cache, never touching the network",
+    )
+    parser.add_argument(
+        "--dedup_index",
+        type=str,
+        default="./data/visited_links.sqlite",
+        help="File of already scraped links (.sqlite or text), '' to keep it in memory",
+    )
+    parser.add_argument(
+        "--near_duplicates",
+        choices=["keep", "drop"],
+        default="keep",
+        help="Drop results whose title and description nearly match an earlier "
+        "result of the run (e.g. one listing on several job boards)",
+    )
+    parser.add_argument(
+        "--near_dup_threshold",
+        type=float,
+        default=0.9,
+        help="Estimated Jaccard similarity of two results' text shingles above "
+        "which they are near-duplicates",
+    )
+    parser.add_argument(
+        "--bloom_capacity",
+        type=int,
+        default=None,
+        help="Track visited links in a Bloom filter sized for this many links",
+    )
+    parser.add_argument(
+        "--output_format",
+        "--output-format",
+        choices=["csv", "parquet", "feather", "sqlite"],
+        default="csv",
+        help="File format for the search results",
+    )
+    parser.add_argument(
+        "--flush_rows",
+        type=int,
+        default=100,
+        help="Number of buffered rows per file that triggers a write",
+    )
+    parser.add_argument(
+        "--flush_interval",
+        type=float,
+        default=5.0,
+        help="Seconds between periodic flushes of buffered rows (0 to disable)",
+    )
     parser.add_argument("--profile", action="store_true", help="Run with profiling")
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default="./data/checkpoint.sqlite",
+        help="Journal of finished result pages used by --resume (empty to disable)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip result pages finished by the previous run and complete partial ones",
+    )
+    parser.add_argument(
+        "--progress_interval",
+        type=float,
+        default=10,
+        help="Seconds between progress lines (0 disables them)",
+    )
+    parser.add_argument(
+        "--metrics_json",
+        type=str,
+        default="./data/run-metrics.json",
+        help="JSON file for the per-stage timings and counters of the run (empty to disable)",
+    )
+    parser.add_argument(
+        "--prometheus_file",
+        type=str,
+        default=None,
+        help="Also write the run metrics in Prometheus text format, e.g. for node_exporter",
+    )
     parser.add_argument(
         "--all_these_words", type=str, help="Words that should all be in the results"
     )
@@ -167,6 +797,13 @@ def main():
     parser.add_argument("--usage_rights", type=str, help="Usage rights of the results")
 
     args = parser.parse_args()
+    if args.offline and not args.cache_dir:
+        parser.error("--offline requires --cache_dir")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+
+    # Turn SIGTERM into a normal exit so buffered rows are flushed on the way out.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
 
     if args.profile:
         with cProfile.Profile() as profile:
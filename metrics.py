@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds, as used by Prometheus clients.
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    float("inf"),
+)
+
+COUNTERS = (
+    "pages",
+    "pages_skipped",
+    "results",
+    "dedup_hits",
+    "near_dup_hits",
+    "cache_hits",
+    "errors",
+    "retries",
+    "circuit_trips",
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are estimated from buckets."""
+
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                # Interpolate within the bucket, clamped to the observed range.
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(BUCKETS[i], self.max)
+                lower = max(lower, self.min)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": round(self.min, 6) if self.count else None,
+            "max": round(self.max, 6) if self.count else None,
+            **{
+                f"p{int(q * 100)}": (round(self.quantile(q), 6) if self.count else None)
+                for q in (0.5, 0.95, 0.99)
+            },
+        }
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and run counters for a scrape.
+
+    Stages are timed with `time(stage)` or `observe(stage, seconds)`, counters
+    bumped with `incr(name)`. Recording is a clock read plus a few integer
+    updates under a lock, cheap enough to leave on. Results can be reported
+    as a periodic progress line, a JSON summary or a Prometheus text file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._started = time.monotonic()
+            self.stages = {}
+            self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    def progress_line(self):
+        elapsed = self.elapsed()
+        with self._lock:
+            counters = dict(self.counters)
+            stages = {
+                name: histogram.quantile(0.5) for name, histogram in self.stages.items()
+            }
+        rate = counters["pages"] / elapsed if elapsed else 0.0
+        line = f"[progress] {elapsed:.0f}s pages={counters['pages']} ({rate:.2f}/s) "
+        line += " ".join(
+            f"{name}={value}" for name, value in counters.items() if name != "pages"
+        )
+        if stages:
+            line += " | p50 " + " ".join(
+                f"{name}={seconds * 1000:.0f}ms" for name, seconds in stages.items()
+            )
+        return line
+
+    def start_progress(self, interval):
+        """Prints a progress line every `interval` seconds until stopped."""
+        if interval <= 0 or self._progress is not None:
+            return
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(interval):
+                print(self.progress_line())
+
+        thread = threading.Thread(target=report, name="metrics-progress", daemon=True)
+        thread.start()
+        self._progress = (stop, thread)
+
+    def stop_progress(self):
+        if self._progress is not None:
+            stop, thread = self._progress
+            stop.set()
+            thread.join()
+            self._progress = None
+
+    def summary(self):
+        elapsed = self.elapsed()
+        with self._lock:
+            return {
+                "started_at": time.strftime(
+                    "%Y-%m-%dT%H:%M:%S", time.localtime(self.started)
+                ),
+                "elapsed_seconds": round(elapsed, 3),
+                "counters": dict(self.counters),
+                "stages": {
+                    name: histogram.to_dict() for name, histogram in self.stages.items()
+                },
+            }
+
+    def _write(self, path, text):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written to a temporary file first, so collectors never read half.
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+    def write_json(self, path):
+        self._write(path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def write_prometheus(self, path, prefix="scraper"):
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each scraper stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in self.stages.items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(
+                        f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{prefix}_stage_seconds_sum{{stage="{name}"}} {histogram.sum:.6f}'
+                )
+                lines.append(
+                    f'{prefix}_stage_seconds_count{{stage="{name}"}} {histogram.count}'
+                )
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_run_seconds gauge")
+        lines.append(f"{prefix}_run_seconds {self.elapsed():.3f}")
+        self._write(path, "\n".join(lines) + "\n")
+
+
+# Shared by utils.py and main.py for the current run.
+metrics = Metrics()
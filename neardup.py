@@ -0,0 +1,139 @@
+import re
+
+import numpy as np
+
+from extractor import NO_DESCRIPTION, NO_TITLE
+
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def result_text(title, description):
+    """The text a result is compared on, without extractor placeholders."""
+    parts = [
+        text
+        for text in (title, description)
+        if isinstance(text, str) and text not in (NO_TITLE, NO_DESCRIPTION)
+    ]
+    return " ".join(parts)
+
+
+def shingles(text, size=5):
+    """
+    The distinct `size`-byte shingles of `text`, each packed into a uint64,
+    after lowercasing it and collapsing punctuation and whitespace, so
+    reposts that only differ in formatting share all of them.
+    """
+    text = NON_WORD.sub(" ", text.lower()).strip()
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    # A text shorter than a shingle is a single one.
+    size = min(size, len(data))
+    if not size:
+        return data
+    count = len(data) - size + 1
+    grams = data[:count].copy()
+    for offset in range(1, size):
+        grams = (grams << np.uint64(8)) | data[offset : offset + count]
+    return np.unique(grams)
+
+
+class NearDuplicateIndex:
+    """
+    Clusters results whose title and description are near-duplicates, such
+    as one listing syndicated to several job boards.
+
+    Each result gets a MinHash signature of its shingles; `num_perm`
+    signature values split into `bands` LSH bands, and results that share a
+    band are candidates. A candidate is a near-duplicate when the signatures
+    estimate a Jaccard similarity of at least `threshold`. So each result is
+    compared with its few candidates instead of every earlier result.
+
+    Results are added one at a time, so the same index serves a running
+    scrape and a batch pass. A result joins the cluster of its most similar
+    earlier result, or starts a cluster of its own. Cluster ids are the id
+    of the cluster's first result and never change once handed out.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=128, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        # One multiply-shift hash per signature value: the top 32 bits of
+        # a * x + b (mod 2**64) with a odd, which needs no modulo.
+        rng = np.random.default_rng(seed)
+        bits = np.iinfo(np.uint64).max
+        self._a = rng.integers(0, bits, size=(num_perm, 1), dtype=np.uint64) | 1
+        self._b = rng.integers(0, bits, size=(num_perm, 1), dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self._clusters = []
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def signature(self, text):
+        hashed = shingles(text)
+        if not len(hashed):
+            return None
+        # In place: this is where most of the time goes.
+        values = self._a * hashed
+        values += self._b
+        values >>= np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+    def add(self, text):
+        """
+        Adds a result's text and returns `(record_id, cluster_id)`; the two
+        differ when it is a near-duplicate of an earlier result.
+        """
+        record_id = len(self._clusters)
+        signature = self.signature(text)
+        if signature is None:
+            # Nothing to compare on, so it can't be a duplicate of anything.
+            self._signatures.append(None)
+            self._clusters.append(record_id)
+            return record_id, record_id
+
+        keys = [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+        candidates = set()
+        for buckets, key in zip(self._buckets, keys):
+            candidates.update(buckets.get(key, ()))
+
+        cluster_id = record_id
+        best = self.threshold
+        for candidate in sorted(candidates):
+            similarity = np.mean(self._signatures[candidate] == signature)
+            if similarity >= best and (cluster_id == record_id or similarity > best):
+                cluster_id = self._clusters[candidate]
+                best = similarity
+
+        for buckets, key in zip(self._buckets, keys):
+            buckets.setdefault(key, []).append(record_id)
+        self._signatures.append(signature)
+        self._clusters.append(cluster_id)
+        return record_id, cluster_id
+
+    def add_result(self, title, description):
+        return self.add(result_text(title, description))
+
+
+def add_cluster_ids(data, index=None, threshold=0.9, drop=False):
+    """
+    Returns a DataFrame of results with a `cluster_id` column, assigned in
+    row order; with `drop` only the first result of every cluster is kept.
+    Pass an `index` to carry the clusters over from earlier chunks.
+    """
+    if index is None:
+        index = NearDuplicateIndex(threshold)
+    ids = [
+        index.add_result(title, description)
+        for title, description in zip(data["title"], data["description"])
+    ]
+    data = data.assign(cluster_id=[cluster_id for _, cluster_id in ids])
+    if drop:
+        data = data[[record_id == cluster_id for record_id, cluster_id in ids]]
+    return data
@@ -0,0 +1,195 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+# Marks the end of a stage's output.
+_END = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside stage threads once the pipeline is shutting down."""
+
+
+class Stage:
+    """
+    One step of a Pipeline: `func(item)` returns an iterable (usually it is a
+    generator) of the items handed to the next stage, so a stage can drop,
+    pass on or fan out what it receives.
+
+    `workers` threads run the stage and at most `queue_size` items wait in
+    front of it; a full queue blocks the stage before it (backpressure).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Optional[Iterable[Any]]],
+        workers: int = 1,
+        queue_size: int = 16,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+
+
+class Pipeline:
+    """
+    Runs items from `source` through `stages`, each in its own threads with a
+    bounded queue in front, so every stage works concurrently with the others
+    (page N is parsed while page N+1 is fetched) and at most a few queues'
+    worth of items are in memory at any time.
+
+    Every stage hands its output on in input order even with several
+    workers: a worker only takes a new item while fewer than `workers +
+    queue_size` items of the stage are waiting to be handed on.
+
+    Iterating the pipeline yields the output of the last stage; `run()`
+    drains it. The first exception raised by a stage stops the pipeline and
+    is re-raised to the caller.
+    """
+
+    def __init__(self, source: Iterable[Any], stages: List[Stage]) -> None:
+        self.source = source
+        self.stages = stages
+        self._stop = threading.Event()
+        self._error = None
+        self._threads = []
+
+    @property
+    def stopped(self) -> bool:
+        """
+        Whether the pipeline is shutting down; a source that blocks waiting on
+        the stages should check it, as nothing will consume it anymore.
+        """
+        return self._stop.is_set()
+
+    def _put(self, outbox, item):
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                outbox.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, inbox):
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _acquire(self, semaphore):
+        while not semaphore.acquire(timeout=0.1):
+            if self._stop.is_set():
+                raise PipelineStopped()
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _feed(self, outbox):
+        try:
+            for item in self.source:
+                self._put(outbox, item)
+            self._put(outbox, _END)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def _start_stage(self, stage, inbox, outbox):
+        take_lock = threading.Lock()
+        lock = threading.Lock()
+        window = threading.Semaphore(stage.workers + stage.queue_size)
+        state = {"taken": 0, "next": 0, "done": {}, "running": stage.workers}
+
+        def hand_on(sequence, outputs):
+            # Called with `lock` held: pass on every finished item that is
+            # next in line.
+            state["done"][sequence] = outputs
+            while state["next"] in state["done"]:
+                for output in state["done"].pop(state["next"]):
+                    self._put(outbox, output)
+                state["next"] += 1
+                window.release()
+
+        def work():
+            try:
+                while True:
+                    self._acquire(window)
+                    with take_lock:
+                        item = self._get(inbox)
+                        if item is _END:
+                            # Leave the marker for the other workers.
+                            inbox.put(item)
+                            break
+                        sequence = state["taken"]
+                        state["taken"] += 1
+                    outputs = list(stage.func(item) or ())
+                    with lock:
+                        hand_on(sequence, outputs)
+                with lock:
+                    state["running"] -= 1
+                    if state["running"] == 0:
+                        self._put(outbox, _END)
+            except PipelineStopped:
+                pass
+            except BaseException as e:
+                self._fail(e)
+
+        for i in range(stage.workers):
+            thread = threading.Thread(
+                target=work, name=f"pipeline-{stage.name}-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def __iter__(self) -> Iterator[Any]:
+        inbox = queue.Queue(self.stages[0].queue_size if self.stages else 16)
+        feeder = threading.Thread(
+            target=self._feed, args=(inbox,), name="pipeline-source", daemon=True
+        )
+        feeder.start()
+        self._threads.append(feeder)
+        for i, stage in enumerate(self.stages):
+            next_size = (
+                self.stages[i + 1].queue_size if i + 1 < len(self.stages) else 16
+            )
+            outbox = queue.Queue(next_size)
+            self._start_stage(stage, inbox, outbox)
+            inbox = outbox
+
+        finished = False
+        try:
+            while True:
+                try:
+                    item = self._get(inbox)
+                except PipelineStopped:
+                    break
+                if item is _END:
+                    break
+                yield item
+            finished = True
+        finally:
+            # Also reached when the caller stops iterating early or is
+            # interrupted; then stages still busy with an item are not
+            # waited for, like cancelled executor futures.
+            self._stop.set()
+            if finished:
+                for thread in self._threads:
+                    thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def run(self) -> int:
+        """
+        Runs the pipeline to completion and returns the number of items that
+        came out of the last stage.
+        """
+        return sum(1 for _ in self)
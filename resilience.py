@@ -0,0 +1,312 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+from metrics import metrics
+
+# Only found on Google's "unusual traffic" interstitial, not on result pages.
+CAPTCHA_MARKERS = (
+    'id="captcha-form"',
+    "Our systems have detected unusual traffic from your computer network",
+)
+
+# Error kinds worth another attempt. Everything else (a 404, a bug in a
+# parser) fails the same way again, so it is given up on straight away.
+RETRYABLE = frozenset(
+    ["timeout", "connection", "rate_limited", "server_error", "captcha", "driver_crash"]
+)
+
+# Kinds that mean the host is blocking us; they open its circuit at once
+# instead of waiting for the failure rate to build up.
+BLOCKING = frozenset(["rate_limited", "captcha"])
+
+
+class FetchError(Exception):
+    """
+    A fetch that failed for good, with the `kind` of its last error:
+    "timeout", "connection", "rate_limited" (429), "server_error" (5xx),
+    "captcha", "driver_crash", "http_error" (other 4xx), "circuit_open" or
+    "unknown". The original exception is chained as `__cause__`.
+    """
+
+    def __init__(self, kind, url, message=None, retry_after=None):
+        super().__init__(message or f"{kind} fetching {url}")
+        self.kind = kind
+        self.url = url
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(FetchError):
+    def __init__(self, url, seconds):
+        super().__init__(
+            "circuit_open",
+            url,
+            f"Circuit for {urlparse(url).netloc} still open after {seconds:.0f}s, "
+            f"giving up on {url}",
+        )
+
+
+def detect_captcha(html, url=None):
+    if url and "/sorry/" in urlparse(url).path:
+        return True
+    return bool(html) and any(marker in html for marker in CAPTCHA_MARKERS)
+
+
+def parse_retry_after(headers):
+    try:
+        return float(headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def classify_error(err):
+    """
+    Returns `(kind, retry_after)` for an exception raised by requests, aiohttp,
+    Selenium or asyncio, without importing any of them.
+    """
+    if isinstance(err, FetchError):
+        return err.kind, err.retry_after
+
+    # requests keeps the response on the exception, aiohttp the status.
+    response = getattr(err, "response", None)
+    status = getattr(response, "status_code", None) or getattr(err, "status", None)
+    if isinstance(status, int):
+        headers = getattr(response, "headers", None) or getattr(err, "headers", None)
+        if status == 429:
+            return "rate_limited", parse_retry_after(headers)
+        if status >= 500 or status == 408:
+            return "server_error", parse_retry_after(headers)
+        return "http_error", None
+
+    name = type(err).__name__
+    if isinstance(err, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in name:
+        return "timeout", None
+    if type(err).__module__.startswith("selenium"):
+        return "driver_crash", None
+    if isinstance(err, ConnectionError) or "Connect" in name:
+        return "connection", None
+    return "unknown", None
+
+
+class _HostCircuit:
+    __slots__ = ("outcomes", "open_until", "cooldown", "trial")
+
+    def __init__(self, window, cooldown):
+        self.outcomes = deque(maxlen=window)
+        self.open_until = 0.0
+        self.cooldown = cooldown
+        self.trial = False
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    A host's circuit opens for `cooldown` seconds when at least
+    `failure_threshold` of its last `window` requests failed (once
+    `min_requests` were made), or straight away on a 429 or CAPTCHA, for as
+    long as a Retry-After header asks if there is one. While open, requests
+    to the host wait instead of being sent. Then a single trial request is
+    let through: if it succeeds the circuit closes, otherwise it opens again
+    for twice as long, up to `max_cooldown`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=0.5,
+        window=20,
+        min_requests=5,
+        cooldown=30.0,
+        max_cooldown=600.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _circuit(self, host):
+        circuit = self._hosts.get(host)
+        if circuit is None:
+            circuit = self._hosts[host] = _HostCircuit(self.window, self.cooldown)
+        return circuit
+
+    def acquire(self, host):
+        """
+        Returns `(wait, trial)`: the seconds to wait before asking again, or 0
+        if a request may be sent now, and whether that request is the trial
+        of a half-open circuit.
+        """
+        with self._lock:
+            circuit = self._circuit(host)
+            if not circuit.open_until:
+                return 0.0, False
+            remaining = circuit.open_until - time.monotonic()
+            if remaining > 0:
+                return remaining, False
+            if circuit.trial:
+                # Someone else's trial is in flight.
+                return min(1.0, circuit.cooldown), False
+            circuit.trial = True
+            return 0.0, True
+
+    def _open(self, host, circuit, seconds, reason):
+        circuit.open_until = time.monotonic() + seconds
+        metrics.incr("circuit_trips")
+        print(f"Circuit open for {host} ({reason}), pausing it for {seconds:.0f}s")
+
+    def record(self, host, ok, trial=False, kind=None, retry_after=None):
+        """
+        Records the outcome of a request: `ok` True or False, or None for one
+        that was abandoned without an outcome.
+        """
+        with self._lock:
+            circuit = self._circuit(host)
+            if trial:
+                circuit.trial = False
+                if ok:
+                    circuit.open_until = 0.0
+                    circuit.cooldown = self.cooldown
+                    circuit.outcomes.clear()
+                    print(f"Circuit closed for {host}")
+                elif ok is False:
+                    circuit.cooldown = min(circuit.cooldown * 2, self.max_cooldown)
+                    self._open(
+                        host,
+                        circuit,
+                        max(circuit.cooldown, retry_after or 0),
+                        f"trial failed: {kind}",
+                    )
+                return
+            if ok is None:
+                return
+            circuit.outcomes.append(ok)
+            if ok or circuit.open_until > time.monotonic():
+                return
+            if kind in BLOCKING:
+                # The host says how long to back off for, if it says at all.
+                self._open(host, circuit, retry_after or circuit.cooldown, kind)
+                return
+            failures = circuit.outcomes.count(False)
+            if (
+                len(circuit.outcomes) >= self.min_requests
+                and failures / len(circuit.outcomes) >= self.failure_threshold
+            ):
+                self._open(
+                    host,
+                    circuit,
+                    circuit.cooldown,
+                    f"{failures} of the last {len(circuit.outcomes)} requests failed",
+                )
+
+
+class Resilience:
+    """
+    Runs fetches with bounded retries and a per-host CircuitBreaker.
+
+    Failed attempts are classified with `classify_error`. Retryable ones are
+    tried again up to `max_retries` times after an exponential backoff with
+    full jitter (a random delay up to `backoff_base * 2**attempt`, capped at
+    `backoff_max`, and never shorter than a Retry-After header). Requests to
+    a host whose circuit is open wait for it to close for at most `max_pause`
+    seconds, then fail with CircuitOpenError, so a blocked host holds up its
+    own pages but not the rest of the run.
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        max_pause=120.0,
+        breaker=None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_pause = max_pause
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+    def backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        return max(delay, retry_after or 0)
+
+    def _admit(self, url, host, paused):
+        """Returns `(wait, trial)` for the next attempt, see CircuitBreaker."""
+        wait, trial = self.breaker.acquire(host)
+        if wait and paused + wait > self.max_pause:
+            raise CircuitOpenError(url, paused)
+        return wait, trial
+
+    def _failed(self, url, host, err, trial, attempt, retries):
+        """Records a failed attempt; returns the backoff or raises FetchError."""
+        kind, retry_after = classify_error(err)
+        # A 404 says nothing about the host's health.
+        self.breaker.record(
+            host, kind == "http_error", trial, kind=kind, retry_after=retry_after
+        )
+        if kind not in RETRYABLE or attempt >= retries:
+            if isinstance(err, FetchError):
+                raise err
+            raise FetchError(kind, url, f"{kind} fetching {url}: {err!r}") from err
+        delay = self.backoff(attempt, retry_after)
+        metrics.incr("retries")
+        print(
+            f"Retrying {url} in {delay:.1f}s after {kind} "
+            f"(attempt {attempt + 1} of {retries})"
+        )
+        return delay
+
+    def call(self, url, func, retries=None):
+        """Returns `func()`, retried as needed for a fetch of `url`."""
+        retries = self.max_retries if retries is None else retries
+        host = urlparse(url).netloc
+        attempt = 0
+        paused = 0.0
+        while True:
+            wait, trial = self._admit(url, host, paused)
+            if wait:
+                time.sleep(wait)
+                paused += wait
+                continue
+            try:
+                result = func()
+            except Exception as err:
+                delay = self._failed(url, host, err, trial, attempt, retries)
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.record(host, None, trial)
+                raise
+            self.breaker.record(host, True, trial)
+            return result
+
+    async def call_async(self, url, func, retries=None):
+        """Like `call`, for a coroutine function `func`."""
+        retries = self.max_retries if retries is None else retries
+        host = urlparse(url).netloc
+        attempt = 0
+        paused = 0.0
+        while True:
+            wait, trial = self._admit(url, host, paused)
+            if wait:
+                await asyncio.sleep(wait)
+                paused += wait
+                continue
+            try:
+                result = await func()
+            except Exception as err:
+                delay = self._failed(url, host, err, trial, attempt, retries)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.record(host, None, trial)
+                raise
+            self.breaker.record(host, True, trial)
+            return result
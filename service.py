@@ -0,0 +1,379 @@
+"""
+Long-running, read-only HTTP query service over the search results, so
+dashboards don't start filter.py (and reload the whole history) per query.
+
+    python service.py --input data/search_results.csv
+    python service.py --store data/results.sqlite
+    curl 'localhost:5000/results?remote=yes&role=Developer&sort=date&per_page=20'
+
+The results and their derived columns are loaded once and reloaded when the
+source file changes. /results takes filter.py's filters as query parameters
+and answers with a page of JSON; responses are kept in an LRU cache and
+carry an ETag, so unchanged results cost a 304.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from argparse import Namespace
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from flask import Flask, Response, request
+
+from filter import COLUMNS, DEFAULT_INPUT, LINK_COLUMNS, add_derived_columns
+from filter import apply_filters, get_classifier, load_results
+from validate import DEFAULT_LINKS_DB, add_link_status
+
+# Accepted values of the filter parameters, as in filter.py's options.
+CHOICES = {
+    "remote": ["yes", "no", "all"],
+    "role": ["Software Engineer", "Developer", "all"],
+    "experience": ["Junior", "Senior", "Staff", "all"],
+    "job_type": ["Cloud", "AI", "Data Scientist", "all"],
+    "link_status": ["ok", "broken", "unchecked", "all"],
+    "sort": ["date", "title", "none"],
+    "order": ["asc", "desc"],
+}
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 1000
+
+
+class QueryError(ValueError):
+    pass
+
+
+class LRUCache:
+    """Thread-safe mapping that keeps the `maxsize` most recently used keys."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def parse_query(args):
+    """
+    Validates the query parameters of a /results request and returns them
+    as a dict with every filter present, or raises QueryError.
+    """
+    query = {}
+    for name, choices in CHOICES.items():
+        default = "desc" if name == "order" else choices[-1]
+        value = args.get(name, default)
+        if value not in choices:
+            raise QueryError(f"{name} must be one of {', '.join(choices)}")
+        query[name] = value
+    query["keyword"] = args.get("keyword") or None
+    query["date_after"] = args.get("date_after") or None
+    if query["date_after"]:
+        try:
+            datetime.strptime(query["date_after"], "%Y-%m-%d")
+        except ValueError:
+            raise QueryError("date_after must be a date as YYYY-MM-DD")
+    for name, default, maximum in (
+        ("days_ago", None, None),
+        ("limit", None, None),
+        ("page", 1, None),
+        ("per_page", DEFAULT_PER_PAGE, MAX_PER_PAGE),
+    ):
+        value = args.get(name)
+        if value in (None, ""):
+            query[name] = default
+            continue
+        try:
+            value = int(value)
+        except ValueError:
+            raise QueryError(f"{name} must be a whole number")
+        if value < 1 or (maximum and value > maximum):
+            raise QueryError(
+                f"{name} must be between 1 and {maximum}"
+                if maximum
+                else f"{name} must be at least 1"
+            )
+        query[name] = value
+    return query
+
+
+class QueryService:
+    """
+    Holds the search results with every derived column in memory and answers
+    filter queries on them.
+
+    The source (a result file or a store built with `store.py ingest`) is
+    checked for changes at most every `reload_interval` seconds and reloaded
+    when its size or modification time moved. Rendered responses are cached
+    per query and data version, so a reload invalidates them all. `days_ago`
+    counts whole days back from today, so those queries are cached per day.
+    """
+
+    def __init__(
+        self,
+        input=DEFAULT_INPUT,
+        store=None,
+        rules_file=None,
+        links_db=DEFAULT_LINKS_DB,
+        cache_size=256,
+        reload_interval=2.0,
+    ):
+        self.input = input
+        self.store = store
+        self.rules_file = rules_file
+        self.links_db = links_db
+        self.reload_interval = reload_interval
+        self.cache = LRUCache(cache_size)
+        self.data = None
+        self.version = 0
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked = 0.0
+        self.refresh(force=True)
+
+    @property
+    def source(self):
+        return self.store or self.input
+
+    def _source_signature(self):
+        if self.store:
+            # Writes to a store in WAL mode land in the -wal file first.
+            paths = (self.store, f"{self.store}-wal")
+        else:
+            # Link checks of a result file live in the link cache.
+            paths = (self.input, self.links_db)
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _load(self):
+        if self.store:
+            from store import ResultStore
+
+            with ResultStore(self.store, self.rules_file) as store:
+                if store.rules_match(self.rules_file):
+                    return store.query(sort="date")
+                return add_derived_columns(
+                    store.query(sort="date", derived=False),
+                    rules_file=self.rules_file,
+                )
+        return add_derived_columns(
+            add_link_status(load_results(self.input), self.links_db),
+            rules_file=self.rules_file,
+        )
+
+    def refresh(self, force=False):
+        """Reloads the results if the source changed since they were loaded."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked < self.reload_interval:
+                return False
+            self._checked = now
+            signature = self._source_signature()
+            if not force and signature == self._signature:
+                return False
+            started = time.perf_counter()
+            data = self._load()
+            self.data = data
+            self._signature = signature
+            self.version += 1
+            self.loaded_at = datetime.now().isoformat(timespec="seconds")
+            self.cache.clear()
+        print(
+            f"Loaded {len(data)} results from '{self.source}' "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return True
+
+    def _filter(self, data, query):
+        args = Namespace(
+            rules=self.rules_file,
+            links_db=self.links_db,
+            **{
+                name: query[name]
+                for name in (
+                    "remote",
+                    "role",
+                    "experience",
+                    "job_type",
+                    "date_after",
+                    "days_ago",
+                    "keyword",
+                    "link_status",
+                )
+            },
+        )
+        data = apply_filters(data, args)
+        if query["sort"] != "none":
+            # Stable, so pages of equal dates don't shuffle between requests.
+            data = data.sort_values(
+                by=query["sort"], ascending=query["order"] == "asc", kind="stable"
+            )
+        if query["limit"]:
+            data = data.head(query["limit"])
+        return data
+
+    def results(self, query):
+        """
+        Returns `(body, etag)` for a page of the results that match `query`
+        (see parse_query), from the cache when it was asked for before.
+        """
+        self.refresh()
+        data, version = self.data, self.version
+        if query["days_ago"] and not query["date_after"]:
+            # Resolved to the date it starts on, which the cache is keyed on.
+            cutoff = date.today() - timedelta(days=query["days_ago"])
+            query = dict(query, date_after=cutoff.isoformat(), days_ago=None)
+        key = (version, tuple(sorted(query.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        matches = self._filter(data, query)
+        total = len(matches)
+        per_page = query["per_page"]
+        start = (query["page"] - 1) * per_page
+        page = matches.iloc[start : start + per_page]
+        columns = [column for column in COLUMNS + LINK_COLUMNS if column in page]
+        columns += get_classifier(self.rules_file).columns
+        body = (
+            "{"
+            f'"total": {total}, "page": {query["page"]}, "per_page": {per_page}, '
+            f'"pages": {-(-total // per_page)}, "version": {version}, "results": '
+            + page[columns].to_json(orient="records", date_format="iso")
+            + "}"
+        )
+        etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        self.cache.put(key, (body, etag))
+        return body, etag
+
+
+def create_app(service):
+    app = Flask(__name__)
+
+    def json_response(payload, status=200):
+        return Response(json.dumps(payload), status=status, mimetype="application/json")
+
+    @app.get("/results")
+    def results():
+        try:
+            query = parse_query(request.args)
+        except QueryError as err:
+            return json_response({"error": str(err)}, 400)
+        body, etag = service.results(query)
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        # Clients may keep responses but must revalidate them, which is a 304
+        # while the results are unchanged.
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+
+    @app.get("/health")
+    def health():
+        service.refresh()
+        return json_response(
+            {
+                "source": service.source,
+                "rows": len(service.data),
+                "version": service.version,
+                "loaded_at": service.loaded_at,
+                "cache": {
+                    "entries": len(service.cache),
+                    "hits": service.cache.hits,
+                    "misses": service.cache.misses,
+                },
+            }
+        )
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query service over job listings.")
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=DEFAULT_INPUT,
+        help="Search results to serve (.csv, .parquet, .feather or .sqlite)",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Serve a store built with `store.py ingest` instead of --input",
+    )
+    parser.add_argument(
+        "--rules",
+        type=str,
+        default=None,
+        help="JSON file with the keyword rules behind the derived columns (default: rules.json)",
+    )
+    parser.add_argument(
+        "--links_db",
+        type=str,
+        default=DEFAULT_LINKS_DB,
+        help="SQLite cache of link checks written by validate.py",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument(
+        "--cache_size", type=int, default=256, help="Query responses kept cached"
+    )
+    parser.add_argument(
+        "--reload_interval",
+        type=float,
+        default=2.0,
+        help="Seconds between checks of the source for changes",
+    )
+    args = parser.parse_args()
+
+    service = QueryService(
+        args.input,
+        args.store,
+        args.rules,
+        args.links_db,
+        cache_size=args.cache_size,
+        reload_interval=args.reload_interval,
+    )
+    create_app(service).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+"""
+Indexed SQLite store that merges the per-run search result files written by
+main.py, so filter.py can query across days and keywords.
+
+    python store.py ingest                       # every ./data/*-search-results.*
+    python store.py ingest data/jobs-2024-12-06-search-results.csv
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from dedup import canonicalize_url
+from extractor import NO_LINK
+from filter import COLUMNS, DEFAULT_PATTERN, LINK_COLUMNS
+
+DEFAULT_STORE = "data/results.sqlite"
+
+# Written by `validate.py --store`.
+LINK_COLUMN_TYPES = dict(zip(LINK_COLUMNS, ["INTEGER", "TEXT", "TEXT"]))
+
+
+# main.py's per-keyword output files, with spaces in the keyword as dashes.
+RESULT_FILENAME = re.compile(r"^(.+)-\d{4}-\d{2}-\d{2}-search-results\.")
+
+
+def filename_keyword(path):
+    """The search keyword of one of main.py's output files, or None."""
+    match = RESULT_FILENAME.match(os.path.basename(path))
+    return match.group(1).replace("-", " ") if match else None
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def rules_digest(rules_file):
+    with open(rules_file, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def link_key(row):
+    """
+    The key results are upserted on: the canonical link or, for results
+    without one, a hash of their text.
+    """
+    link = row.get("link")
+    if isinstance(link, str) and link and link != NO_LINK:
+        return canonicalize_url(link)
+    text = "\n".join(str(row.get(name)) for name in ("keyword", "title", "description"))
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fts_query(text):
+    # Every term is matched as a quoted phrase, so user input can't trip over
+    # FTS5 query syntax; terms are ANDed.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+class ResultStore:
+    """
+    Search results keyed on their canonical link, with indexes on `date` and
+    `keyword` and an FTS5 index over `title` and `description`.
+
+    The derived filter columns (see classifier.py) are computed at ingest time
+    and stored alongside each row, so filter.py's predicates run as SQL. The
+    digest of the rules they were derived with is kept in the `meta` table;
+    ingesting with different rules re-derives them for every row.
+    """
+
+    def __init__(self, path=DEFAULT_STORE, rules_file=None):
+        from classifier import RULES_FILE, RuleClassifier
+
+        self.path = path
+        self.rules_file = rules_file or RULES_FILE
+        self.classifier = RuleClassifier(self.rules_file)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self._create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _create_schema(self):
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                link_key TEXT NOT NULL UNIQUE,
+                title TEXT,
+                date TEXT,
+                description TEXT,
+                keyword TEXT,
+                link TEXT,
+                first_seen TEXT,
+                last_seen TEXT
+            );
+            CREATE INDEX IF NOT EXISTS results_date ON results (date);
+            CREATE INDEX IF NOT EXISTS results_keyword ON results (keyword, date);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL
+            );
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+                title, description, content='results', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+                INSERT INTO results_fts (rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+                INSERT INTO results_fts (results_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS results_au
+            AFTER UPDATE OF title, description ON results BEGIN
+                INSERT INTO results_fts (results_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+                INSERT INTO results_fts (rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END;
+            """
+        )
+        existing = {
+            row[1] for row in self.connection.execute("PRAGMA table_info(results)")
+        }
+        for column, kind in LINK_COLUMN_TYPES.items():
+            if column not in existing:
+                self.connection.execute(
+                    f"ALTER TABLE results ADD COLUMN {column} {kind}"
+                )
+        for column in self.classifier.columns:
+            if column not in existing:
+                kind = "INTEGER" if column in self.classifier.flags else "TEXT"
+                self.connection.execute(
+                    f"ALTER TABLE results ADD COLUMN {quote_identifier(column)} {kind}"
+                )
+        if self._meta("rules") is None and len(self) == 0:
+            self._set_rules()
+        self.connection.commit()
+
+    def _set_rules(self):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)",
+            (rules_digest(self.rules_file),),
+        )
+
+    def _meta(self, key):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def rules_match(self, rules_file=None):
+        """
+        Whether the stored derived columns were computed with `rules_file`.
+        """
+        return self._meta("rules") == rules_digest(rules_file or self.rules_file)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _derived_values(self, data):
+        self.classifier.classify(data)
+        values = []
+        for column in self.classifier.columns:
+            if column in self.classifier.flags:
+                values.append(data[column].astype(int).tolist())
+            else:
+                values.append(data[column].astype(str).tolist())
+        return values
+
+    def ingest(self, data, keyword=None):
+        """
+        Upserts the rows of a DataFrame shaped like main.py's output and
+        returns the number of rows that were new. Rows without a keyword get
+        `keyword`.
+        """
+        import pandas as pd
+
+        data = data.copy()
+        for column in COLUMNS:
+            if column not in data.columns:
+                data[column] = None
+        if keyword is not None:
+            data["keyword"] = data["keyword"].fillna(keyword)
+        data[["title", "description"]] = data[["title", "description"]].fillna("")
+        dates = pd.to_datetime(data["date"], errors="coerce").dt.strftime("%Y-%m-%d")
+        records = data[COLUMNS].astype(object)
+        records["date"] = dates
+        records = records.where(records.notna(), None)
+        derived = self._derived_values(data)
+        now = datetime.now().isoformat(timespec="seconds")
+
+        columns = ["link_key", *COLUMNS, "first_seen", "last_seen"]
+        columns += self.classifier.columns
+        updated = [
+            column for column in columns if column not in ("link_key", "first_seen")
+        ]
+        assignments = ", ".join(
+            (
+                "date = COALESCE(excluded.date, results.date)"
+                if column == "date"
+                else f"{quote_identifier(column)} = excluded.{quote_identifier(column)}"
+            )
+            for column in updated
+        )
+        rows = [
+            (link_key(record), *record.values(), now, now, *extra)
+            for record, *extra in zip(records.to_dict("records"), *derived)
+        ]
+
+        before = len(self)
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO results ({', '.join(map(quote_identifier, columns))}) "
+                f"VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT (link_key) DO UPDATE SET {assignments}",
+                rows,
+            )
+        return len(self) - before
+
+    def ingest_file(self, path, chunksize=100_000):
+        """
+        Ingests one of main.py's output files (any format filter.py reads).
+        Results written without a keyword get the one in the file's name.
+        Returns `(rows, new_rows)`, or None if the file is unchanged since it
+        was last ingested.
+        """
+        from filter import iter_results
+
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        seen = self.connection.execute(
+            "SELECT size, mtime FROM ingested_files WHERE path = ?", (key,)
+        ).fetchone()
+        if seen == (stat.st_size, stat.st_mtime):
+            return None
+
+        rows = new_rows = 0
+        for chunk in iter_results(path, chunksize=chunksize):
+            rows += len(chunk)
+            new_rows += self.ingest(chunk, filename_keyword(path))
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO ingested_files (path, size, mtime) "
+                "VALUES (?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime),
+            )
+        return rows, new_rows
+
+    def links(self):
+        """Returns the link of every result that has one."""
+        return [
+            link
+            for (link,) in self.connection.execute(
+                "SELECT link FROM results WHERE link IS NOT NULL AND link != ?",
+                (NO_LINK,),
+            )
+        ]
+
+    def set_link_status(self, statuses):
+        """
+        Writes `{link_key: (status, final_url, checked_at)}` from
+        validate.validate_links() into the results' link columns.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE results SET status = ?, final_url = ?, checked_at = ? "
+                "WHERE link_key = ?",
+                [(*row, key) for key, row in statuses.items()],
+            )
+
+    def reclassify(self, chunksize=100_000):
+        """
+        Re-derives the stored filter columns with the store's current rules.
+        """
+        import pandas as pd
+
+        last_id = 0
+        assignments = ", ".join(
+            f"{quote_identifier(column)} = ?" for column in self.classifier.columns
+        )
+        with self.connection:
+            while True:
+                data = pd.read_sql_query(
+                    "SELECT id, title, description FROM results WHERE id > ? "
+                    "ORDER BY id LIMIT ?",
+                    self.connection,
+                    params=(last_id, chunksize),
+                )
+                if data.empty:
+                    break
+                derived = self._derived_values(data)
+                self.connection.executemany(
+                    f"UPDATE results SET {assignments} WHERE id = ?",
+                    [(*values, id) for id, *values in zip(data["id"], *derived)],
+                )
+                last_id = int(data["id"].iloc[-1])
+            self._set_rules()
+
+    def query(
+        self,
+        date_after=None,
+        keyword=None,
+        search=None,
+        flags=None,
+        categories=None,
+        link_status=None,
+        sort=None,
+        ascending=False,
+        limit=None,
+        derived=True,
+    ):
+        """
+        Returns the matching results as a DataFrame with the columns filter.py
+        works with.
+
+        `flags` maps flag columns to the required value and `categories` maps
+        category columns to the accepted labels. `link_status` is "ok",
+        "broken" or "unchecked", see validate.link_health. `search` is matched
+        against the FTS index; without a `sort` such results come best match
+        first. Pass `derived=False` to leave out the stored derived columns.
+        """
+        import pandas as pd
+
+        columns = [f"results.{name}" for name in [*COLUMNS, *LINK_COLUMN_TYPES]]
+        if derived:
+            columns += [
+                f"results.{quote_identifier(name)}" for name in self.classifier.columns
+            ]
+        sql = f"SELECT {', '.join(columns)} FROM results"
+        where, params = [], []
+        if search:
+            sql += " JOIN results_fts ON results_fts.rowid = results.id"
+            where.append("results_fts MATCH ?")
+            params.append(fts_query(search))
+        if date_after is not None:
+            where.append("results.date >= ?")
+            params.append(date_after)
+        if keyword is not None:
+            where.append("results.keyword = ?")
+            params.append(keyword)
+        for name, value in (flags or {}).items():
+            where.append(f"results.{quote_identifier(name)} = ?")
+            params.append(int(value))
+        for name, labels in (categories or {}).items():
+            where.append(
+                f"results.{quote_identifier(name)} IN ({', '.join('?' for _ in labels)})"
+            )
+            params.extend(labels)
+        if link_status == "ok":
+            where.append("results.status BETWEEN 200 AND 399")
+        elif link_status == "broken":
+            where.append("(results.status >= 400 OR results.status = 0)")
+        elif link_status == "unchecked":
+            where.append("results.status IS NULL")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        direction = "ASC" if ascending else "DESC"
+        if sort:
+            # Missing values go last either way, as with pandas' sort_values.
+            sql += (
+                f" ORDER BY results.{sort} IS NULL, results.{sort} {direction}, "
+                "results.id"
+            )
+        elif search:
+            sql += " ORDER BY results_fts.rank"
+        else:
+            sql += " ORDER BY results.id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        data = pd.read_sql_query(sql, self.connection, params=params)
+        data["date"] = pd.to_datetime(data["date"], errors="coerce")
+        data["status"] = data["status"].astype("Int64")
+        if derived:
+            for name in self.classifier.flags:
+                data[name] = data[name].astype(bool)
+        return data
+
+
+def ingest(args):
+    paths = args.paths or sorted(glob.glob(DEFAULT_PATTERN))
+    if not paths:
+        print(f"No search results to ingest, looked for '{DEFAULT_PATTERN}'")
+        return
+    with ResultStore(args.store, args.rules) as store:
+        for path in paths:
+            if os.path.abspath(path) == os.path.abspath(args.store):
+                continue
+            try:
+                ingested = store.ingest_file(path, args.chunksize)
+            except Exception as e:
+                print(f"Failed to ingest '{path}': {e}")
+                continue
+            if ingested is None:
+                print(f"Skipped '{path}', unchanged since the last ingest")
+            else:
+                print(f"Ingested '{path}': {ingested[0]} rows, {ingested[1]} new")
+        if not store.rules_match():
+            print("Rules changed, re-deriving the filter columns for every result")
+            store.reclassify(args.chunksize)
+        print(f"{len(store)} results in '{args.store}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed store of search results.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="Merge per-run search result files into the store"
+    )
+    ingest_parser.add_argument(
+        "paths",
+        nargs="*",
+        help=f"Files to ingest (default: {DEFAULT_PATTERN})",
+    )
+    ingest_parser.add_argument("--store", default=DEFAULT_STORE)
+    ingest_parser.add_argument(
+        "--rules",
+        default=None,
+        help="JSON file with the keyword rules behind the derived columns (default: rules.json)",
+    )
+    ingest_parser.add_argument("--chunksize", type=int, default=100_000)
+    ingest_parser.set_defaults(func=ingest)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
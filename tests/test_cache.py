@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+import cache
+from cache import CacheMissError, PageCache
+from utils import ScraperUtils
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "time", clock.time)
+    return clock
+
+
+def test_entries_are_fresh_until_the_ttl_passes(tmp_path, clock):
+    pages = PageCache(str(tmp_path), ttl=60)
+    pages.put("https://example.com/a", "<html>a</html>", etag='"v1"')
+    assert pages.get("https://example.com/a") == "<html>a</html>"
+    clock.now += 61
+    assert pages.get("https://example.com/a") is None
+    html, meta, fresh = pages.lookup("https://example.com/a")
+    assert html == "<html>a</html>" and not fresh
+    assert pages.validators(meta) == {"If-None-Match": '"v1"'}
+
+
+def test_offline_serves_stale_entries_and_raises_on_misses(tmp_path, clock):
+    PageCache(str(tmp_path), ttl=60).put("https://example.com/a", "a")
+    clock.now += 3600
+    offline = PageCache(str(tmp_path), ttl=60, offline=True)
+    assert offline.get("https://example.com/a") == "a"
+    with pytest.raises(CacheMissError):
+        offline.get("https://example.com/b")
+
+
+def test_refresh_makes_a_revalidated_entry_fresh(tmp_path, clock):
+    pages = PageCache(str(tmp_path), ttl=60)
+    pages.put("https://example.com/a", "a", last_modified="Mon, 01 Jan 2024")
+    clock.now += 61
+    _, meta, _ = pages.lookup("https://example.com/a")
+    pages.refresh("https://example.com/a", meta)
+    html, meta, fresh = pages.lookup("https://example.com/a")
+    assert (html, fresh) == ("a", True)
+    assert meta["last_modified"] == "Mon, 01 Jan 2024"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    pages = PageCache(str(tmp_path), max_bytes=10**9)
+    for age, name in enumerate("abc"):
+        pages.put(f"https://example.com/{name}", name * 2000)
+        _, meta_path = pages._paths(f"https://example.com/{name}")
+        os.utime(meta_path, (1000 + age, 1000 + age))
+    pages.max_bytes = pages._size + 1
+    # Using the oldest entry makes it the most recently used one.
+    pages.lookup("https://example.com/a")
+    pages.put("https://example.com/d", "d" * 2000)
+    assert pages.lookup("https://example.com/a")[0] is not None
+    assert pages.lookup("https://example.com/b")[0] is None
+    assert pages.lookup("https://example.com/d")[0] is not None
+
+
+class Response:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+def test_request_html_revalidates_stale_entries(tmp_path, clock):
+    scraper = ScraperUtils(cache=PageCache(str(tmp_path), ttl=60))
+    requests = []
+
+    def get(link, headers=None):
+        requests.append(headers)
+        return responses.pop(0)
+
+    scraper._get = get
+    responses = [Response(200, "v1", {"ETag": '"v1"'})]
+    assert scraper.request_html("https://example.com/a") == "v1"
+    assert scraper.request_html("https://example.com/a") == "v1"
+    assert requests == [{}]
+
+    clock.now += 61
+    responses = [Response(304)]
+    assert scraper.request_html("https://example.com/a") == "v1"
+    assert requests[-1] == {"If-None-Match": '"v1"'}
+    assert scraper.cache.lookup("https://example.com/a")[2]
+
+    clock.now += 61
+    responses = [Response(200, "v2", {"ETag": '"v2"'})]
+    assert scraper.request_html("https://example.com/a") == "v2"
+    assert scraper.cache.get("https://example.com/a") == "v2"
+
+
+def test_request_html_skips_caching_uncacheable_pages(tmp_path, clock):
+    scraper = ScraperUtils(cache=PageCache(str(tmp_path)))
+    scraper._get = lambda link, headers=None: Response(200, "consent page")
+    html = scraper.request_html("https://example.com/a", cacheable=lambda html: False)
+    assert html == "consent page"
+    assert scraper.cache.get("https://example.com/a") is None
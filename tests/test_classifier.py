@@ -0,0 +1,98 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+from classifier import RuleClassifier
+
+
+@pytest.fixture(params=["pyarrow", "re"])
+def engine(request, monkeypatch):
+    if request.param == "re":
+        # Makes `import pyarrow` fail, so the plain `re` fallback runs.
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+    return request.param
+
+
+def write_rules(tmp_path, rules):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"version": 1, **rules}), encoding="utf-8")
+    return str(path)
+
+
+def per_rule(text, keywords, case_sensitive):
+    """The per-rule `str.contains` the classifier must agree with."""
+    pattern = "|".join(keywords)
+    return text.str.contains(pattern, case=case_sensitive, regex=True).tolist()
+
+
+TITLES = [
+    "Senior Software Engineer",
+    "Software Engineering Lead",
+    "Data Scientist (AI)",
+    "remote junior DEVELOPER",
+    "Staff Engineer, Cloud",
+    "",
+]
+
+
+def test_overlapping_keywords_of_different_rules(tmp_path, engine):
+    rules = {
+        "flags": {
+            "Senior Software": {"keywords": ["Senior Software"]},
+            "Software Engineer": {"keywords": ["Software Engineer"]},
+            "Engineer": {"keywords": ["Engineer"]},
+            "Scientist": {"keywords": ["Scientist"], "case_sensitive": True},
+        },
+        "categories": {
+            "Level": {
+                "labels": [
+                    {"label": "Lead", "keywords": ["Engineering Lead"]},
+                    {"label": "Data", "keywords": ["Data Scientist"]},
+                    {"label": "Senior", "keywords": ["Senior"]},
+                ]
+            }
+        },
+    }
+    classifier = RuleClassifier(write_rules(tmp_path, rules))
+    data = classifier.classify(pd.DataFrame({"title": TITLES}))
+    text = pd.Series(TITLES)
+    for name, spec in rules["flags"].items():
+        expected = per_rule(text, spec["keywords"], spec.get("case_sensitive", False))
+        assert data[name].tolist() == expected, name
+    assert data["Level"].tolist() == ["Senior", "Lead", "Data", "All", "All", "All"]
+
+
+def test_default_rules(engine):
+    data = RuleClassifier().classify(pd.DataFrame({"title": TITLES}))
+    assert data["Software Engineer"].tolist() == [True, True, False, False, True, False]
+    assert data["Remote"].tolist() == [False, False, False, True, False, False]
+    assert data["Developer"].tolist() == [False, False, False, True, False, False]
+    # Categories are case-sensitive by default.
+    assert data["Experience Level"].tolist() == [
+        "Senior",
+        "All",
+        "All",
+        "All",
+        "Staff",
+        "All",
+    ]
+    assert data["Job Type"].tolist() == ["All", "All", "AI", "All", "Cloud", "All"]
+    assert isinstance(data["Job Type"].dtype, pd.CategoricalDtype)
+
+
+def test_rules_reading_several_fields(tmp_path, engine):
+    rules = {
+        "flags": {
+            "Python": {"fields": ["title", "description"], "keywords": ["python"]}
+        }
+    }
+    data = pd.DataFrame(
+        {
+            "title": ["Python Developer", "Developer", None],
+            "description": [None, "Django and Python", "Java"],
+        }
+    )
+    RuleClassifier(write_rules(tmp_path, rules)).classify(data)
+    assert data["Python"].tolist() == [True, True, False]
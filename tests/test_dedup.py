@@ -0,0 +1,50 @@
+import pytest
+
+from dedup import URLIndex, canonicalize_url
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://host:99999/",
+        "http://[::1/",
+    ],
+)
+def test_canonicalize_url_keeps_unparsable_urls(url):
+    assert canonicalize_url(f"  {url} ") == url
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("HTTP://Example.COM/jobs/", "https://example.com/jobs"),
+        ("https://example.com:443/a", "https://example.com/a"),
+        ("http://example.com:80/a", "https://example.com/a"),
+        ("https://example.com:8443/a", "https://example.com:8443/a"),
+        ("https://example.com/a#section", "https://example.com/a"),
+        ("https://example.com", "https://example.com/"),
+        (
+            "https://example.com/a?utm_source=google&b=2&gclid=x&a=1&_hsenc=y",
+            "https://example.com/a?a=1&b=2",
+        ),
+        (
+            "https://www.google.com/url?q=https://example.com/a/%3Fref%3Dx&sa=U",
+            "https://example.com/a",
+        ),
+        ("mailto:jobs@example.com", "mailto:jobs@example.com"),
+        ("", ""),
+    ],
+)
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_url_index_dedups_canonical_urls(tmp_path):
+    path = str(tmp_path / "links.sqlite")
+    with URLIndex(path) as index:
+        assert index.add("https://example.com/a?utm_source=x")
+        assert not index.add("http://EXAMPLE.com/a/")
+        assert index.hits == 1
+    with URLIndex(path, bloom_capacity=1000) as index:
+        assert "https://example.com/a" in index
+        assert "https://example.com/b" not in index
@@ -0,0 +1,61 @@
+import random
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline, Stage
+
+
+def test_pipeline_keeps_input_order_with_several_workers():
+    def slow_double(item):
+        time.sleep(random.uniform(0, 0.005))
+        yield item * 2
+
+    stages = [Stage("double", slow_double, workers=4, queue_size=2)]
+    assert list(Pipeline(range(100), stages)) == [i * 2 for i in range(100)]
+
+
+def test_pipeline_stages_drop_and_fan_out_items():
+    def evens(item):
+        if item % 2 == 0:
+            yield item
+
+    def twice(item):
+        return [item, item]
+
+    stages = [Stage("evens", evens, workers=2), Stage("twice", twice, workers=3)]
+    assert list(Pipeline(range(6), stages)) == [0, 0, 2, 2, 4, 4]
+    assert Pipeline(range(6), stages).run() == 6
+
+
+def test_pipeline_reraises_the_first_stage_error_and_stops():
+    seen = []
+    lock = threading.Lock()
+
+    def fail_on_three(item):
+        if item == 3:
+            raise ValueError("bad item")
+        yield item
+
+    def record(item):
+        with lock:
+            seen.append(item)
+        yield item
+
+    stages = [Stage("check", fail_on_three), Stage("record", record)]
+    # The source is practically endless; only stopping lets run() return.
+    pipeline = Pipeline(iter(range(10**9)), stages)
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run()
+    assert pipeline.stopped
+    assert 3 not in seen
+
+
+def test_pipeline_reraises_source_errors():
+    def source():
+        yield 1
+        raise RuntimeError("source failed")
+
+    with pytest.raises(RuntimeError, match="source failed"):
+        Pipeline(source(), [Stage("pass", lambda item: [item])]).run()
@@ -0,0 +1,126 @@
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, FetchError, Resilience, classify_error
+
+
+class FakeClock:
+    """Stands in for the time module, so cooldowns pass without sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def test_circuit_opens_once_failure_rate_is_reached(clock):
+    breaker = CircuitBreaker(failure_threshold=0.5, min_requests=4, cooldown=30)
+    for ok in (True, False, True):
+        breaker.record("host", ok)
+    assert breaker.acquire("host") == (0.0, False)
+    breaker.record("host", False)
+    wait, trial = breaker.acquire("host")
+    assert wait == pytest.approx(30) and not trial
+
+
+def test_circuit_opens_at_once_on_blocking_errors(clock):
+    breaker = CircuitBreaker(cooldown=30)
+    breaker.record("host", False, kind="rate_limited", retry_after=90)
+    assert breaker.acquire("host")[0] == pytest.approx(90)
+    assert breaker.acquire("other") == (0.0, False)
+
+
+def test_half_open_trial_success_closes_the_circuit(clock):
+    breaker = CircuitBreaker(cooldown=30)
+    breaker.record("host", False, kind="captcha")
+    clock.now += 30
+    assert breaker.acquire("host") == (0.0, True)
+    # Only one trial at a time.
+    wait, trial = breaker.acquire("host")
+    assert wait > 0 and not trial
+    breaker.record("host", True, trial=True)
+    assert breaker.acquire("host") == (0.0, False)
+
+
+def test_half_open_trial_failure_doubles_the_cooldown(clock):
+    breaker = CircuitBreaker(cooldown=30, max_cooldown=100)
+    breaker.record("host", False, kind="captcha")
+    for cooldown in (60, 100, 100):
+        clock.now += 1000
+        assert breaker.acquire("host") == (0.0, True)
+        breaker.record("host", False, trial=True, kind="captcha")
+        assert breaker.acquire("host")[0] == pytest.approx(cooldown)
+
+
+def test_abandoned_trial_leaves_the_circuit_half_open(clock):
+    breaker = CircuitBreaker(cooldown=30)
+    breaker.record("host", False, kind="captcha")
+    clock.now += 30
+    assert breaker.acquire("host") == (0.0, True)
+    breaker.record("host", None, trial=True)
+    assert breaker.acquire("host") == (0.0, True)
+
+
+class Status(Exception):
+    def __init__(self, status):
+        self.status = status
+
+
+@pytest.mark.parametrize(
+    "err, kind",
+    [
+        (Status(429), "rate_limited"),
+        (Status(503), "server_error"),
+        (Status(404), "http_error"),
+        (TimeoutError(), "timeout"),
+        (ConnectionError(), "connection"),
+        (KeyError(), "unknown"),
+    ],
+)
+def test_classify_error(err, kind):
+    assert classify_error(err)[0] == kind
+
+
+def test_call_retries_retryable_errors(clock):
+    outcomes = [ConnectionError(), Status(503), "page"]
+
+    def fetch():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert Resilience(max_retries=3).call("https://host/a", fetch) == "page"
+    assert not outcomes
+
+
+def test_call_gives_up_on_errors_that_would_repeat(clock):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise Status(404)
+
+    with pytest.raises(FetchError) as raised:
+        Resilience(max_retries=3).call("https://host/a", fetch)
+    assert raised.value.kind == "http_error"
+    assert len(calls) == 1
+
+
+def test_call_fails_when_the_circuit_stays_open(clock):
+    retry = Resilience(max_pause=60, breaker=CircuitBreaker(cooldown=600))
+    retry.breaker.record("host", False, kind="captcha")
+    with pytest.raises(FetchError) as raised:
+        retry.call("https://host/a", lambda: "page")
+    assert raised.value.kind == "circuit_open"
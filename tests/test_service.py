@@ -0,0 +1,55 @@
+from datetime import date
+
+import pandas as pd
+
+import filter
+import service
+from service import QueryService, parse_query
+
+
+def write_results(path):
+    pd.DataFrame(
+        {
+            "title": ["Remote Developer", "Senior Engineer", "Data Scientist"],
+            "date": ["2024-12-01", "2024-12-04", "2024-12-06"],
+            "description": ["a", "b", "c"],
+            "keyword": ["python"] * 3,
+            "link": [f"https://example.com/{n}" for n in range(3)],
+        }
+    ).to_csv(path, index=False)
+
+
+def make_service(tmp_path):
+    path = tmp_path / "results.csv"
+    write_results(path)
+    return QueryService(
+        str(path), links_db=str(tmp_path / "links.sqlite"), reload_interval=3600
+    )
+
+
+def test_filters_on_derived_columns_without_deriving_them_again(tmp_path, monkeypatch):
+    query_service = make_service(tmp_path)
+
+    def derive(*args, **kwargs):
+        raise AssertionError("derived columns recomputed")
+
+    monkeypatch.setattr(filter, "add_derived_columns", derive)
+    body, _ = query_service.results(parse_query({"remote": "yes"}))
+    assert '"total": 1' in body
+
+
+def test_days_ago_cutoff_moves_with_the_date(tmp_path, monkeypatch):
+    query_service = make_service(tmp_path)
+    query = parse_query({"days_ago": "3"})
+
+    class Today(date):
+        current = date(2024, 12, 6)
+
+        @classmethod
+        def today(cls):
+            return cls.current
+
+    monkeypatch.setattr(service, "date", Today)
+    assert '"total": 2' in query_service.results(query)[0]
+    Today.current = date(2024, 12, 8)
+    assert '"total": 1' in query_service.results(query)[0]
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from store import ResultStore, filename_keyword
+
+
+def test_filename_keyword():
+    assert (
+        filename_keyword("data/software-engineer-2024-12-06-search-results.csv")
+        == "software engineer"
+    )
+    assert filename_keyword("data/export.csv") is None
+
+
+def test_ingest_fills_missing_keywords_from_the_filename(tmp_path):
+    path = tmp_path / "remote-jobs-2024-12-06-search-results.csv"
+    pd.DataFrame(
+        {
+            "title": ["Remote Developer", "Senior Engineer"],
+            "date": ["2024-12-05", "2024-12-06"],
+            "description": ["a", "b"],
+            "keyword": [None, "python"],
+            "link": ["https://example.com/1", "https://example.com/2"],
+        }
+    ).to_csv(path, index=False)
+    with ResultStore(str(tmp_path / "results.sqlite")) as store:
+        assert store.ingest_file(str(path)) == (2, 2)
+        assert store.query(keyword="remote jobs")["link"].tolist() == [
+            "https://example.com/1"
+        ]
+        assert store.query(keyword="python")["link"].tolist() == [
+            "https://example.com/2"
+        ]
@@ -1,74 +1,858 @@
-import requests
 import time
 import csv
 import os
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
+import atexit
+import queue
+import threading
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from dedup import URLIndex
+from extractor import GoogleResultExtractor
+from filter import COLUMNS
+from cache import CacheMissError
+from metrics import metrics
+from resilience import FetchError, Resilience, detect_captcha
 
 
 # from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
-from datetime import datetime, timedelta
+from datetime import datetime
 import pytz
-import re
 
 
-class ScraperUtils:
-    def __init__(self):
-        self.visited_links = []
+def parse_html(markup, parser="html.parser"):
+    # bs4 (like selenium and requests) is only imported once it is needed, so
+    # `--help` and runs that never touch a browser start quickly.
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(markup, parser)
+
+
+def create_web_driver(web_agent="firefox", headless=True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+    if web_agent == "firefox":
+        options = FirefoxOptions()
+        if headless:
+            options.add_argument("--headless")
+        with metrics.time("driver_launch"):
+            return webdriver.Firefox(options=options)
+    elif web_agent == "chrome":
+        options = Options()
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--no-sandbox")
+        if headless:
+            options.add_argument("--headless")
+        with metrics.time("driver_launch"):
+            return webdriver.Chrome(options=options)
+    raise Exception("Invalid web agent! Please use 'firefox' or 'chrome'.")
+
+
+class WebDriverPool:
+    """
+    Bounded pool of reusable WebDriver instances.
+
+    Drivers are launched lazily up to `size`, handed out with `driver()` and
+    returned to the pool afterwards. A driver is recycled once it has served
+    `max_uses` pages, or straight away if it fails a health check or the page
+    it was used for raised an error. With `page_load_timeout` a page that
+    takes longer to load raises instead of holding its driver.
+
+    Usage:
+        with WebDriverPool("firefox", headless=True, size=2) as pool:
+            with pool.driver() as driver:
+                driver.get(url)
+    """
+
+    def __init__(
+        self,
+        web_agent="firefox",
+        headless=True,
+        size=1,
+        max_uses=10,
+        page_load_timeout=None,
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.web_agent = web_agent
+        self.headless = headless
+        self.size = size
+        self.max_uses = max_uses
+        self.page_load_timeout = page_load_timeout
+        self.stats = {"launched": 0, "reused": 0, "recycled": 0, "unhealthy": 0}
+        self._idle = queue.LifoQueue()
+        self._uses = {}
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _launch(self):
+        driver = create_web_driver(self.web_agent, self.headless)
+        if self.page_load_timeout:
+            driver.set_page_load_timeout(self.page_load_timeout)
+        with self._lock:
+            self._uses[driver] = 0
+            self.stats["launched"] += 1
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception as err:
+            print(f"Error shutting down web driver: {err}")
 
-    def alreadyExists(self, link):
-        if link in self.visited_links:
+    def is_healthy(self, driver):
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            driver.execute_script("return document.readyState")
             return True
-        return False
+        except WebDriverException:
+            return False
 
-    def request_page(self, link):
-        resp = requests.get(link, timeout=45)
-        return BeautifulSoup(resp.content, "html.parser")
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("Cannot acquire a driver from a closed pool.")
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._launch()
+                if self.is_healthy(driver):
+                    with self._lock:
+                        self.stats["reused"] += 1
+                    return driver
+                with self._lock:
+                    self.stats["unhealthy"] += 1
+                self._discard(driver)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, driver, discard=False):
+        try:
+            with self._lock:
+                uses = self._uses.get(driver, 0) + 1
+                self._uses[driver] = uses
+            if self._closed or discard:
+                self._discard(driver)
+            elif self.max_uses and uses >= self.max_uses:
+                with self._lock:
+                    self.stats["recycled"] += 1
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
 
-    def request_page_with_web_driver(
-        self, link, headless, web_agent="firefox", func=None
-    ):
-        options = driver = None
-        if web_agent == "firefox":
-            options = webdriver.FirefoxOptions()
-            if headless:
-                options.add_argument("--headless")
-            driver = webdriver.Firefox(options=options)
-        elif web_agent == "chrome":
-            options = Options()
-            options.add_argument("--disable-dev-shm-usage")
-            if headless:
-                options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            driver = webdriver.Chrome(options=options)
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        discard = False
+        try:
+            yield driver
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            self.release(driver, discard=discard)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        with self._lock:
+            drivers = list(self._uses)
+        for driver in drivers:
+            self._discard(driver)
+        print(
+            f"Web driver pool closed, launched: {self.stats['launched']}, "
+            f"reused: {self.stats['reused']}, recycled: {self.stats['recycled']}, "
+            f"unhealthy: {self.stats['unhealthy']}"
+        )
+
+
+class RateLimiter:
+    """
+    Global limiter that spaces request starts at least `min_interval` seconds
+    apart, no matter how many worker threads are asking for a slot.
+    """
+
+    def __init__(self, min_interval=0.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def reserve(self):
+        """Claims the next start slot and returns the seconds until it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        return slot - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host.
+    """
+
+    def __init__(self, max_per_host=2):
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def limit(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self._semaphores[host] = semaphore
+        with semaphore:
+            yield
+
+
+class ResultSink:
+    """
+    Long-lived, thread-safe writer that keeps one open handle per output file
+    and buffers rows until `batch_size` rows are pending for a file or
+    `flush_interval` seconds have passed. Everything pending is flushed on
+    `close()`, which also runs when the sink is used as a context manager and
+    at exit. Subclasses implement the storage format.
+    """
+
+    extension = ""
+    # Whether flushed rows are on disk straight away, rather than on close().
+    durable_flush = True
+
+    def __init__(self, fieldnames=COLUMNS, batch_size=100, flush_interval=5.0):
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._flushed = {}
+        self._buffers = {}
+        self._handles = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, daemon=True
+            )
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _open_file(self, filename):
+        raise NotImplementedError
+
+    def _write_rows(self, handle, rows):
+        raise NotImplementedError
+
+    def _close_file(self, handle):
+        raise NotImplementedError
+
+    def _open(self, filename):
+        handle = self._handles.get(filename)
+        if handle is None:
+            directory = os.path.dirname(filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handle = self._handles[filename] = self._open_file(filename)
+        return handle
+
+    def write(self, filename, data_list):
+        with self._lock:
+            buffer = self._buffers.setdefault(filename, [])
+            buffer.extend(data_list)
+            if len(buffer) >= self.batch_size:
+                self._flush_file(filename)
+
+    def _flush_file(self, filename):
+        buffer = self._buffers.get(filename)
+        if not buffer:
+            return
+        try:
+            with metrics.time("write"):
+                self._write_rows(self._open(filename), buffer)
+            self.rows_written += len(buffer)
+            self._flushed[filename] = self._flushed.get(filename, 0) + len(buffer)
+            buffer.clear()
+        except Exception as err:
+            metrics.incr("errors")
+            print(f"Error writing to {filename}: {err}")
+
+    def flush(self, filename=None):
+        """
+        Writes out the rows pending for `filename` (for every file by default)
+        and returns True if none are left pending.
+        """
+        with self._lock:
+            filenames = [filename] if filename else list(self._buffers)
+            for name in filenames:
+                self._flush_file(name)
+            return not any(self._buffers.get(name) for name in filenames)
+
+    def flushed_rows(self, filename):
+        """Rows written out to `filename` so far, not counting buffered ones."""
+        with self._lock:
+            return self._flushed.get(filename, 0)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self.flush()
+            for filename, handle in self._handles.items():
+                try:
+                    self._close_file(handle)
+                except Exception as err:
+                    print(f"Error closing {filename}: {err}")
+            self._handles.clear()
+        atexit.unregister(self.close)
+
+
+class CSVSink(ResultSink):
+    """
+    Appends rows to CSV files, writing the header only when a file is created.
+    """
+
+    extension = ".csv"
+
+    def _open_file(self, filename):
+        is_new = not os.path.isfile(filename) or os.path.getsize(filename) == 0
+        file = open(filename, mode="a", newline="", encoding="utf-8")
+        writer = csv.DictWriter(file, fieldnames=self.fieldnames)
+        if is_new:
+            writer.writeheader()
+        return file, writer
+
+    def _write_rows(self, handle, rows):
+        file, writer = handle
+        writer.writerows(rows)
+        file.flush()
+
+    def _close_file(self, handle):
+        handle[0].close()
+
+
+class ArrowSink(ResultSink):
+    """
+    Base for the Arrow-backed formats. Columnar files cannot be appended to,
+    so every flush adds a record batch to a temporary file which replaces the
+    output on close; rows from an existing output file are carried over first.
+    The `date` column is stored as a real date type.
+    """
+
+    durable_flush = False
+
+    def _schema(self):
+        import pyarrow as pa
+
+        return pa.schema(
+            [
+                (name, pa.date32() if name == "date" else pa.string())
+                for name in self.fieldnames
+            ]
+        )
+
+    def _read_existing(self, filename):
+        raise NotImplementedError
+
+    def _new_writer(self, path, schema):
+        raise NotImplementedError
+
+    def _open_file(self, filename):
+        schema = self._schema()
+        temp_filename = f"{filename}.tmp"
+        writer = self._new_writer(temp_filename, schema)
+        if os.path.isfile(filename):
+            writer.write_table(self._read_existing(filename).cast(schema))
+        return writer, schema, temp_filename, filename
+
+    def _write_rows(self, handle, rows):
+        import pyarrow as pa
+
+        writer, schema = handle[:2]
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+    def _close_file(self, handle):
+        writer, _, temp_filename, filename = handle
+        writer.close()
+        os.replace(temp_filename, filename)
+
+
+class ParquetSink(ArrowSink):
+    extension = ".parquet"
+
+    def _read_existing(self, filename):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(filename)
+
+    def _new_writer(self, path, schema):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(path, schema)
+
+
+class FeatherSink(ArrowSink):
+    extension = ".feather"
+
+    def _read_existing(self, filename):
+        import pyarrow.feather as feather
+
+        return feather.read_table(filename)
+
+    def _new_writer(self, path, schema):
+        import pyarrow as pa
+
+        return pa.ipc.new_file(path, schema)
+
+
+class SQLiteSink(ResultSink):
+    """
+    Appends rows to a `results` table, one database file per output file.
+    """
+
+    extension = ".sqlite"
+
+    def _open_file(self, filename):
+        connection = sqlite3.connect(filename, check_same_thread=False)
+        columns = ", ".join(f"{name} TEXT" for name in self.fieldnames)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS results ({columns})")
+        return connection
+
+    def _write_rows(self, handle, rows):
+        placeholders = ", ".join("?" for _ in self.fieldnames)
+        handle.executemany(
+            f"INSERT INTO results ({', '.join(self.fieldnames)}) VALUES ({placeholders})",
+            [
+                [
+                    value.isoformat() if hasattr(value, "isoformat") else value
+                    for value in (row.get(name) for name in self.fieldnames)
+                ]
+                for row in rows
+            ],
+        )
+        handle.commit()
+
+    def _close_file(self, handle):
+        handle.close()
+
+
+OUTPUT_SINKS = {
+    "csv": CSVSink,
+    "parquet": ParquetSink,
+    "feather": FeatherSink,
+    "sqlite": SQLiteSink,
+}
+
+
+def create_sink(output_format="csv", **kwargs):
+    try:
+        return OUTPUT_SINKS[output_format](**kwargs)
+    except KeyError:
+        raise ValueError(
+            f"Invalid output format! Please use one of: {', '.join(OUTPUT_SINKS)}."
+        )
+
+
+# Readiness conditions per site. `selector` must match an element, the DOM
+# must stop changing for `quiet_period` seconds and, with `network_idle`, no
+# new resources may start loading during that period. `timeout` is a hard cap.
+WAIT_SETTINGS = {
+    "www.google.com": {
+        "selector": "div.MjjYud",
+        "quiet_period": 0.3,
+        "network_idle": False,
+        "timeout": 10,
+    },
+    "www.scmp.com": {
+        "selector": None,
+        "quiet_period": 1.0,
+        "network_idle": True,
+        "timeout": 15,
+    },
+    "default": {
+        "selector": None,
+        "quiet_period": 0.5,
+        "network_idle": False,
+        "timeout": 10,
+    },
+}
+
+READINESS_SCRIPT = """
+const selector = arguments[0];
+return [
+    document.readyState,
+    selector ? document.querySelector(selector) !== null : true,
+    document.getElementsByTagName("*").length,
+    performance.getEntriesByType("resource").length,
+];
+"""
+
+
+def get_wait_settings(link=None):
+    host = urlparse(link).netloc if link else None
+    return WAIT_SETTINGS.get(host, WAIT_SETTINGS["default"])
+
+
+def wait_until_ready(driver, link=None, poll_interval=0.1, **overrides):
+    """
+    Blocks until the page loaded in `driver` satisfies the readiness conditions
+    configured for its site in WAIT_SETTINGS, or the hard timeout expires.
+
+    Args:
+        driver: WebDriver with the page already requested.
+        link (str): URL used to look up the site settings.
+        poll_interval (float): Seconds between readiness checks.
+        **overrides: Values replacing the site's `selector`, `quiet_period`,
+            `network_idle` or `timeout` setting.
+
+    Returns:
+        float: Seconds spent waiting.
+    """
+    from selenium.common.exceptions import WebDriverException
+
+    settings = {**get_wait_settings(link), **overrides}
+    started = time.monotonic()
+    deadline = started + settings["timeout"]
+    last_snapshot = None
+    stable_since = started
+    ready = False
+
+    while True:
+        now = time.monotonic()
+        try:
+            state, has_selector, dom_size, resources = driver.execute_script(
+                READINESS_SCRIPT, settings["selector"]
+            )
+        except WebDriverException:
+            state, has_selector, dom_size, resources = "loading", False, 0, 0
+
+        snapshot = (dom_size, resources if settings["network_idle"] else 0)
+        if snapshot != last_snapshot:
+            last_snapshot = snapshot
+            stable_since = now
+
+        loaded = state == "complete" or (
+            state == "interactive" and not settings["network_idle"]
+        )
+        if loaded and has_selector and now - stable_since >= settings["quiet_period"]:
+            ready = True
+            break
+        if now >= deadline:
+            break
+        time.sleep(poll_interval)
+
+    elapsed = time.monotonic() - started
+    print(
+        f"Page {'ready' if ready else 'wait timed out'} after {elapsed:.2f}s: "
+        f"{link or driver.current_url}"
+    )
+    metrics.observe("wait", elapsed)
+    return elapsed
+
+
+# Counts the items matching arguments[0] and scrolls to the bottom. With
+# fields (arguments[2]: name -> [CSS selector, attribute or null for the
+# text]), also returns those fields of the items from index arguments[1] on,
+# so each round only ships the values read from newly appended nodes.
+SCROLL_SCRIPT = """
+const items = document.querySelectorAll(arguments[0]);
+const fields = arguments[2];
+const fresh = [];
+for (let i = fields ? arguments[1] : items.length; i < items.length; i++) {
+    const found = {};
+    for (const [name, [selector, attribute]] of Object.entries(fields)) {
+        const node = items[i].querySelector(selector);
+        if (node) {
+            found[name] = attribute ? node.getAttribute(attribute) : node.textContent;
+        }
+    }
+    fresh.push(found);
+}
+window.scrollTo(0, document.body.scrollHeight);
+return [items.length, document.body.scrollHeight, fresh];
+"""
+
+
+def scroll_items(
+    driver,
+    selector,
+    fields=None,
+    total=None,
+    max_scrolls=50,
+    time_budget=60,
+    patience=2,
+    **wait_overrides,
+):
+    """
+    Scrolls an infinite-scroll page until its items matching `selector` are
+    loaded. Items are counted in the page, not by re-parsing the page source.
+
+    With `fields`, yields a dict of those fields for every item as soon as it
+    has been appended, so the caller can process items while more are
+    loading. Only the field values leave the browser, not the items' HTML;
+    without `fields` nothing is yielded and only the count is read.
+
+    Stops once `total` items are loaded, after `patience` scrolls in a row
+    without new items or page growth, or when `max_scrolls` or `time_budget`
+    seconds are used up. Assumes items are only ever appended, as on Google
+    and SCMP result lists.
+
+    Args:
+        driver: WebDriver with the page already loaded.
+        selector (str): CSS selector matching one item.
+        fields (dict): Maps a field name to `[css_selector, attribute]`
+            inside an item; a None attribute reads the element's text.
+        total (int): Number of items to stop at, if known.
+        max_scrolls (int): Maximum number of scrolls.
+        time_budget (float): Maximum seconds spent scrolling.
+        patience (int): Scrolls without growth before giving up.
+        **wait_overrides: Readiness settings used between scrolls, see
+            wait_until_ready.
+    """
+    wait_settings = {
+        "selector": None,
+        "quiet_period": 0.5,
+        "timeout": 5,
+        **wait_overrides,
+    }
+    deadline = time.monotonic() + time_budget
+    loaded, height, stalled = 0, None, 0
+    for scroll in range(max_scrolls + 1):
+        count, new_height, fresh = driver.execute_script(
+            SCROLL_SCRIPT, selector, loaded, fields
+        )
+        yield from fresh
+
+        if count > loaded or new_height != height:
+            stalled = 0
+        else:
+            stalled += 1
+        loaded, height = max(count, loaded), new_height
+
+        if total is not None and loaded >= total:
+            reason = f"all {total} items loaded"
+        elif stalled >= patience:
+            reason = "no new items"
+        elif scroll == max_scrolls:
+            reason = f"scroll limit ({max_scrolls}) reached"
+        elif time.monotonic() >= deadline:
+            reason = f"time budget ({time_budget}s) used up"
         else:
-            raise Exception("Invalid Web Agent! Please use firefox or chrome.")
+            # Give lazily loaded items a chance to render before counting.
+            wait_until_ready(driver, **wait_settings)
+            continue
+        print(f"Stopped scrolling after {scroll} scrolls, {reason}: {loaded} items")
+        return
+
+
+# Sent with plain HTTP requests; Google serves a stripped-down page without
+# result blocks to the default python-requests user agent.
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+# Class name that only appears in a Google results page with organic results.
+GOOGLE_RESULT_MARKER = "MjjYud"
+
+PARSERS = ["html.parser", "lxml"]
+
+
+def create_http_session(pool_size=10):
+    """
+    Returns a requests.Session that keeps up to `pool_size` connections per
+    host alive and asks for gzip-compressed responses.
+    """
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+
+class ScraperUtils:
+    def __init__(
+        self, visited_links=None, parser="html.parser", pool_size=10, cache=None
+    ):
+        # Canonical-URL index; pass a persistent URLIndex to dedup across runs.
+        self.visited_links = visited_links if visited_links is not None else URLIndex()
+        # BeautifulSoup tree builder, "lxml" is several times faster.
+        self.parser = parser
+        self.pool_size = pool_size
+        self.extractor = GoogleResultExtractor()
+        # Optional cache.PageCache shared by every fetch path.
+        self.cache = cache
+        # Retries and per-host circuit breaking for every fetch.
+        self.resilience = Resilience()
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = create_http_session(self.pool_size)
+        return self._session
 
+    def alreadyExists(self, link):
+        return link in self.visited_links
+
+    def get_cached_html(self, link):
+        if self.cache is None:
+            return None
+        html = self.cache.get(link)
+        if html is not None:
+            metrics.incr("cache_hits")
+        return html
+
+    def _get(self, link, headers=None):
+        with metrics.time("page_load"):
+            resp = self.session.get(link, timeout=45, headers=headers)
+        resp.raise_for_status()
+        if detect_captcha(resp.text, resp.url):
+            raise FetchError("captcha", link, f"CAPTCHA served for {link}")
+        return resp
+
+    def request_html(self, link, cacheable=None):
+        """
+        Fetches `link` over HTTP through the page cache, if there is one. A
+        response only goes into the cache if `cacheable(html)` is true, so a
+        consent or bot-check page isn't served from it again.
+        """
+        if self.cache is None:
+            return self.resilience.call(link, lambda: self._get(link)).text
+
+        html, meta, fresh = self.cache.lookup(link)
+        if html is not None and fresh:
+            metrics.incr("cache_hits")
+            return html
+        if self.cache.offline:
+            raise CacheMissError(f"Page not in cache: {link}")
+
+        resp = self.resilience.call(
+            link, lambda: self._get(link, headers=self.cache.validators(meta))
+        )
+        if resp.status_code == 304 and html is not None:
+            self.cache.refresh(link, meta)
+            return html
+        if cacheable is not None and not cacheable(resp.text):
+            return resp.text
+        self.cache.put(
+            link,
+            resp.text,
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        )
+        return resp.text
+
+    def request_page(self, link):
+        return parse_html(self.request_html(link), self.parser)
+
+    def _load_with_web_driver(self, driver, link, func=None):
         # load all asynchronously rendered content.
-        driver.get(link)
-        time.sleep(5)
+        with metrics.time("page_load"):
+            driver.get(link)
+        wait_until_ready(driver, link)
         driver.execute_script("window.stop();")
 
         page_source = driver.page_source
-        soup = BeautifulSoup(page_source, "html.parser")
+        if detect_captcha(page_source, driver.current_url):
+            raise FetchError("captcha", link, f"CAPTCHA served for {link}")
         if func:
-            page_source = func(driver, soup)
-            soup = BeautifulSoup(page_source, "html.parser")
+            page_source = func(driver, parse_html(page_source, self.parser))
+        return page_source
+
+    def request_html_with_web_driver(
+        self,
+        link,
+        headless,
+        web_agent="firefox",
+        func=None,
+        driver=None,
+        read_cache=True,
+    ):
+        """
+        Loads `link` in a browser. With a borrowed `driver` (e.g. from a
+        WebDriverPool) the page is tried once, as a crashed driver can't be
+        replaced here; retry around the pool checkout instead. Otherwise every
+        attempt runs in a fresh driver. Without `read_cache` the cached copy
+        is ignored and replaced with the browser's.
+        """
+        if read_cache:
+            cached_html = self.get_cached_html(link)
+            if cached_html is not None:
+                return cached_html
+
+        if driver is not None:
+            page_source = self._load_with_web_driver(driver, link, func)
+        else:
+
+            def attempt():
+                driver = create_web_driver(web_agent, headless)
+                try:
+                    return self._load_with_web_driver(driver, link, func)
+                finally:
+                    driver.quit()
 
-        driver.quit()
-        return soup
+            page_source = self.resilience.call(link, attempt)
+        if self.cache is not None and page_source:
+            self.cache.put(link, page_source)
+        return page_source
+
+    def request_page_with_web_driver(
+        self, link, headless, web_agent="firefox", func=None, driver=None
+    ):
+        page_source = self.request_html_with_web_driver(
+            link, headless, web_agent, func, driver
+        )
+        return parse_html(page_source, self.parser)
 
     def write_data_to_csv(self, data_list, filename="data.csv"):
         try:
-            fieldnames = [
-                "title",
-                "date",
-                "description",
-                "keyword",
-                "link",
-            ]
+            fieldnames = COLUMNS
             # Create the file if it doesn't already exist
             if not os.path.isfile(filename):
                 with open(filename, mode="w", newline="", encoding="utf-8") as file:
@@ -83,19 +867,33 @@ class ScraperUtils:
             print(err)
 
     def check_if_already_scraped(self, link):
-        already_exists = link in self.visited_links
-        if not already_exists:
-            self.visited_links.append(link)
-        return already_exists
+        return not self.visited_links.add(link)
 
     def register_scraped_link(self, link):
-        self.visited_links.append(link)
+        self.visited_links.add(link)
 
     def check_link_validity(self, url):
+        """
+        Whether `url` answers without an error status once redirects are
+        followed, asked over the pooled session. See validate.py for checking
+        links in bulk.
+        """
+        from validate import HEAD_UNSUPPORTED
+
+        def head():
+            response = self.session.head(url, timeout=5, allow_redirects=True)
+            if response.status_code in HEAD_UNSUPPORTED:
+                # stream=True leaves the body unread.
+                with self.session.get(
+                    url, timeout=5, allow_redirects=True, stream=True
+                ) as response:
+                    pass
+            response.raise_for_status()
+            return response
+
         try:
-            response = requests.head(url, timeout=5)
-            return response.status_code == 200
-        except requests.RequestException:
+            return self.resilience.call(url, head, retries=1).ok
+        except FetchError:
             return False
 
     def optimize_paragraphs(self, paragraphs):
@@ -140,34 +938,25 @@ class ScraperUtils:
         Raises:
             Exception: If an invalid browser agent is specified.
         """
-        driver = None
-
-        if web_agent == "firefox":
-            options = FirefoxOptions()
-            if headless:
-                options.add_argument("--headless")
-            driver = webdriver.Firefox(options=options)
-
-        elif web_agent == "chrome":
-            options = Options()
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--no-sandbox")
-            if headless:
-                options.add_argument("--headless")
-            driver = webdriver.Chrome(options=options)
-
-        else:
-            raise Exception("Invalid web agent! Please use 'firefox' or 'chrome'.")
-
-        try:
-            driver.get(link)
-            time.sleep(5)  # Wait for asynchronous content to load
-            driver.execute_script("window.stop();")  # Stop any further loading
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-        finally:
-            driver.quit()
-
-        return soup
+        cached_html = self.get_cached_html(link)
+        if cached_html is not None:
+            return parse_html(cached_html, self.parser)
+
+        def attempt():
+            driver = create_web_driver(web_agent, headless)
+            try:
+                driver.get(link)
+                wait_until_ready(driver, link)  # Wait for asynchronous content
+                driver.execute_script("window.stop();")  # Stop any further loading
+                return driver.page_source
+            finally:
+                driver.quit()
+
+        page_source = self.resilience.call(link, attempt)
+
+        if self.cache is not None:
+            self.cache.put(link, page_source)
+        return parse_html(page_source, self.parser)
 
     def get_google_links(self, google_page_url):
         parsed_page = self.request_page_with_web_driver(google_page_url)
@@ -179,49 +968,30 @@ class ScraperUtils:
 
     def extract_google_search_result(self, result_div):
         try:
-            # Extract title
-            title_element = result_div.find("h3", class_="LC20lb")
-            title = title_element.text if title_element else "No title found"
-
-            # Extract date
-            date_span = result_div.find("span", class_="LEwnzc")
-            date_str = date_span.text if date_span else None
-            date = None
-
-            if date_str:
-                # Try to parse exact date
-                date_match = re.search(r"\d{1,2}\s\w{3}\s\d{4}", date_str)
-                if date_match:
-                    date = datetime.strptime(date_match.group(), "%d %b %Y").date()
-                else:
-                    # Handle relative dates
-                    relative_date_match = re.search(
-                        r"(\d+)\s*(day|hour|minute)s?\s*ago", date_str, re.IGNORECASE
-                    )
-                    if relative_date_match:
-                        number, unit = relative_date_match.groups()
-                        number = int(number)
-                        if "day" in unit.lower():
-                            date = datetime.now().date() - timedelta(days=number)
-                        elif "hour" in unit.lower():
-                            date = datetime.now().date() - timedelta(hours=number)
-                        elif "minute" in unit.lower():
-                            date = datetime.now().date()
-
-            # Extract description
-            desc_div = result_div.find("div", class_="VwiC3b")
-            description = desc_div.text if desc_div else "No description found"
-
-            # Extract link
-            link_element = result_div.find("a", attrs={"jsname": "UWckNb"})
-            link = link_element["href"] if link_element else "No link found"
-
-            return {
-                "title": title,
-                "date": date,
-                "description": description,
-                "link": link,
-            }
+            return self.extractor.extract_block(result_div).to_dict()
         except Exception as e:
+            metrics.incr("errors")
             print(f"Error extracting search result: {e}")
             return None
+
+    def extract_google_search_results(self, html):
+        return self.extract_google_search_page(html)[0]
+
+    def extract_google_search_page(self, html):
+        """
+        Returns the results on a Google result page and whether the page links
+        to a next one (None if that is unknown).
+        """
+        if not html:
+            return [], None
+        with metrics.time("parse"):
+            if self.parser == "lxml":
+                tree = self.extractor.parse_lxml(html)
+            else:
+                tree = parse_html(html, self.parser)
+        with metrics.time("extract"):
+            if self.parser == "lxml":
+                results = self.extractor.extract_tree(tree)
+            else:
+                results = self.extractor.extract_soup(tree)
+            return results, self.extractor.has_next_page(tree)
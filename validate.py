@@ -0,0 +1,365 @@
+"""
+Bulk validation of the links in scraped search results.
+
+    python validate.py                               # every ./data/*-search-results.*
+    python validate.py data/jobs-2024-12-06-search-results.csv
+    python validate.py --store data/results.sqlite   # every link in the store
+
+Links are checked concurrently over pooled connections with a HEAD request
+that follows redirects, falling back to GET where HEAD isn't supported. The
+outcome is cached in data/link-status.sqlite for --max_age days, which is
+where filter.py looks up the `status`, `final_url` and `checked_at` columns
+of result files; a store gets the columns written into it.
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import sqlite3
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from checkpoint import read_links
+from dedup import canonicalize_url
+from extractor import NO_LINK
+from filter import DEFAULT_PATTERN
+from resilience import CircuitBreaker, FetchError, Resilience, parse_retry_after
+
+DEFAULT_LINKS_DB = "data/link-status.sqlite"
+
+# Statuses for which servers commonly mean "not for HEAD" rather than
+# "not there", so the link is asked for again with GET.
+HEAD_UNSUPPORTED = frozenset([403, 405, 501])
+
+# `status` of a link that could not be reached at all (DNS, timeout, TLS).
+UNREACHABLE = 0
+
+
+def link_health(status, which):
+    """
+    Boolean mask of the `status` values (a pandas Series) that are `which`:
+    "ok" (2xx/3xx), "broken" (4xx/5xx or unreachable) or "unchecked".
+    """
+    if which == "ok":
+        return status.between(200, 399)
+    if which == "broken":
+        return (status >= 400) | (status == UNREACHABLE)
+    if which == "unchecked":
+        return status.isna()
+    raise ValueError(f"Unknown link status filter: {which}")
+
+
+class LinkStatusCache:
+    """
+    SQLite cache of link checks keyed on the canonical link, so a link shared
+    by many results (or runs) is only checked once per `max_age`.
+    """
+
+    def __init__(self, path=DEFAULT_LINKS_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS link_status (
+                link_key TEXT PRIMARY KEY,
+                status INTEGER,
+                final_url TEXT,
+                checked_at TEXT
+            )
+            """
+        )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, keys, checked_after=None):
+        """
+        Returns `{key: (status, final_url, checked_at)}` for the `keys` in the
+        cache, leaving out checks older than `checked_after` (ISO timestamp).
+        """
+        keys = list(keys)
+        found = {}
+        # Stays well below SQLite's limit on query parameters.
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            sql = (
+                "SELECT link_key, status, final_url, checked_at FROM link_status "
+                f"WHERE link_key IN ({', '.join('?' for _ in batch)})"
+            )
+            params = list(batch)
+            if checked_after is not None:
+                sql += " AND checked_at >= ?"
+                params.append(checked_after)
+            for key, *row in self.connection.execute(sql, params):
+                found[key] = tuple(row)
+        return found
+
+    def put(self, rows):
+        """Stores `(key, status, final_url, checked_at)` rows."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO link_status "
+                "(link_key, status, final_url, checked_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+
+class LinkValidator:
+    """
+    Checks links concurrently: at most `concurrency` requests in flight and
+    `per_host` per host, each cancelled after `timeout` seconds. Requests go
+    over aiohttp, or pooled requests in worker threads without it. Timeouts,
+    429s and 502-504s are retried once and counted per host by a CircuitBreaker,
+    so a host that falls over is paused rather than hammered.
+    """
+
+    def __init__(self, concurrency=50, per_host=4, timeout=10.0, resilience=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.resilience = resilience or Resilience(
+            max_retries=1,
+            backoff_max=5.0,
+            max_pause=60.0,
+            breaker=CircuitBreaker(min_requests=10, cooldown=15.0),
+        )
+
+    def check(self, links):
+        """
+        Returns `{link: (status, final_url)}`. `status` is the HTTP status of
+        the final response after redirects, UNREACHABLE if there was none, or
+        None if the link was skipped because its host stayed paused.
+        """
+        return asyncio.run(self._check_all(links))
+
+    async def _check_all(self, links):
+        from GScraper import _import_aiohttp
+        from utils import HTTP_HEADERS, create_http_session
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        host_semaphores = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        aiohttp = _import_aiohttp()
+        if aiohttp is not None:
+            session = aiohttp.ClientSession(
+                headers=HTTP_HEADERS,
+                connector=aiohttp.TCPConnector(
+                    limit=self.concurrency, limit_per_host=self.per_host
+                ),
+            )
+            executor = None
+        else:
+            session = create_http_session(self.concurrency)
+            # One thread per check in flight, as in GScraper.open_fetcher.
+            executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="check")
+
+        async def request(method, link):
+            # Both clients time out on their own. A thread can't be cancelled,
+            # so wrapping it in wait_for would free its slot while it runs on.
+            if aiohttp is not None:
+                async with session.request(
+                    method,
+                    link,
+                    allow_redirects=True,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as resp:
+                    return resp.status, str(resp.url), resp.headers
+
+            def blocking():
+                # stream=True leaves a GET's body unread.
+                with session.request(
+                    method,
+                    link,
+                    allow_redirects=True,
+                    timeout=self.timeout,
+                    stream=True,
+                ) as resp:
+                    return resp.status_code, resp.url, resp.headers
+
+            return await asyncio.get_running_loop().run_in_executor(executor, blocking)
+
+        # Last response per link, kept for links whose retries ran out.
+        responses = {}
+
+        async def attempt(link):
+            async with semaphore, host_semaphores[urlparse(link).netloc]:
+                status, final_url, headers = await request("HEAD", link)
+                if status in HEAD_UNSUPPORTED:
+                    status, final_url, headers = await request("GET", link)
+            responses[link] = status, final_url
+            # Worth another try, and they tell the breaker the host is
+            # struggling. Any other status, a 500 included, is the link's
+            # answer: one broken page says nothing about the rest of its site.
+            if status == 429:
+                raise FetchError(
+                    "rate_limited", link, retry_after=parse_retry_after(headers)
+                )
+            if status in (502, 503, 504):
+                raise FetchError("server_error", link)
+            return status, final_url
+
+        async def check_one(link):
+            try:
+                return await self.resilience.call_async(link, lambda: attempt(link))
+            except FetchError as err:
+                if err.kind == "circuit_open":
+                    return None, None
+                return responses.get(link, (UNREACHABLE, None))
+            except ValueError:
+                # A malformed URL (e.g. an out of range port) is broken.
+                return UNREACHABLE, None
+
+        try:
+            statuses = await asyncio.gather(*(check_one(link) for link in links))
+        finally:
+            if aiohttp is not None:
+                await session.close()
+            else:
+                session.close()
+                executor.shutdown(wait=False, cancel_futures=True)
+        return dict(zip(links, statuses))
+
+
+def validate_links(links, cache, validator=None, max_age=7):
+    """
+    Returns `{key: (status, final_url, checked_at)}` for `links`, keyed on
+    their canonical form. Links checked within `max_age` days come from
+    `cache`; the rest are checked with `validator` and cached.
+    """
+    validator = validator or LinkValidator()
+    keys = {}
+    for link in links:
+        if isinstance(link, str) and link and link != NO_LINK:
+            keys.setdefault(canonicalize_url(link), link)
+    checked_after = None
+    if max_age is not None:
+        checked_after = (datetime.now() - timedelta(days=max_age)).isoformat(
+            timespec="seconds"
+        )
+    found = cache.get(keys, checked_after)
+    todo = [link for key, link in keys.items() if key not in found]
+    print(f"{len(keys)} distinct links, {len(found)} cached, {len(todo)} to check")
+    if todo:
+        checked_at = datetime.now().isoformat(timespec="seconds")
+        rows = [
+            (canonicalize_url(link), status, final_url, checked_at)
+            for link, (status, final_url) in validator.check(todo).items()
+            # Links skipped on a paused host are checked again next time.
+            if status is not None
+        ]
+        cache.put(rows)
+        found.update((key, tuple(row)) for key, *row in rows)
+    return found
+
+
+def add_link_status(data, links_db=DEFAULT_LINKS_DB):
+    """
+    Adds the link columns (filter.LINK_COLUMNS) cached in `links_db` to a
+    DataFrame of results and returns it; links that were never checked get
+    missing values.
+    """
+    import pandas as pd
+
+    keys = [
+        canonicalize_url(link) if isinstance(link, str) and link != NO_LINK else None
+        for link in data["link"]
+    ]
+    found = {}
+    if os.path.isfile(links_db):
+        with LinkStatusCache(links_db) as cache:
+            found = cache.get({key for key in keys if key is not None})
+    rows = [found.get(key, (None, None, None)) for key in keys]
+    data["status"] = pd.array([row[0] for row in rows], dtype="Int64")
+    data["final_url"] = [row[1] for row in rows]
+    data["checked_at"] = [row[2] for row in rows]
+    return data
+
+
+def summarize(statuses):
+    counts = defaultdict(int)
+    for status, _, _ in statuses.values():
+        if status == UNREACHABLE:
+            counts["unreachable"] += 1
+        elif status >= 400:
+            counts["broken"] += 1
+        else:
+            counts["ok"] += 1
+    return ", ".join(f"{name}: {count}" for name, count in sorted(counts.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the links of search results.")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help=f"Result files whose links to check (default: {DEFAULT_PATTERN})",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Check every link in a store built with `store.py ingest` and "
+        "write the status columns into it",
+    )
+    parser.add_argument(
+        "--links_db",
+        type=str,
+        default=DEFAULT_LINKS_DB,
+        help="SQLite cache of link checks",
+    )
+    parser.add_argument(
+        "--max_age",
+        type=float,
+        default=7,
+        help="Days before a cached check is repeated",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="Checks in flight at once"
+    )
+    parser.add_argument(
+        "--per_host", type=int, default=4, help="Checks in flight per host"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=10.0, help="Seconds before a check fails"
+    )
+    args = parser.parse_args()
+
+    validator = LinkValidator(args.concurrency, args.per_host, args.timeout)
+    with LinkStatusCache(args.links_db) as cache:
+        if args.store:
+            from store import ResultStore
+
+            with ResultStore(args.store) as store:
+                statuses = validate_links(store.links(), cache, validator, args.max_age)
+                store.set_link_status(statuses)
+        else:
+            paths = args.paths or sorted(glob.glob(DEFAULT_PATTERN))
+            if not paths:
+                print(f"No search results to check, looked for '{DEFAULT_PATTERN}'")
+                return
+            links = []
+            for path in paths:
+                try:
+                    links.extend(read_links(path))
+                except Exception as e:
+                    print(f"Failed to read links from '{path}': {e}")
+            statuses = validate_links(links, cache, validator, args.max_age)
+    print(
+        f"Link status saved to '{args.store or args.links_db}': {summarize(statuses)}"
+    )
+
+
+if __name__ == "__main__":
+    main()